@@ -1,5 +1,15 @@
+import asyncio
 import collections
+import concurrent.futures
+import hashlib
+import itertools
+import json
+import os
+import random
+import re
+import sqlite3
 import threading
+import time
 import werkzeug
 
 try:
@@ -8,20 +18,50 @@ except ImportError:
     # P3
     import xmlrpc.client as xmlrpclib
 
-try:
-    import Queue
-except ImportError:
-    # P3
-    import queue as Queue
-
 from xml.etree import ElementTree as ET
 
 from docutils import nodes, utils
 from docutils.parsers.rst import Directive, directives
 from sphinx.domains import Domain
+from sphinx.util import logging
+
+logger = logging.getLogger(__name__)
 
 def setup(app):
     app.add_domain(OdooDemoDomain)
+    # maximum age (in seconds) of a cached demo:fields result, 0 to never
+    # expire them
+    app.add_config_value('demo_fields_cache_ttl', 7 * 24 * 3600, '')
+    # maximum number of demo:fields results kept in the cache
+    app.add_config_value('demo_fields_cache_size', 2000, '')
+    # only serve demo:fields from the cache and never contact the demo
+    # server (e.g. ``sphinx-build -D demo_fields_offline=1``)
+    app.add_config_value('demo_fields_offline', False, '')
+    # maximum number of concurrent calls to the demo server
+    app.add_config_value('demo_fields_concurrency', 4, '')
+    # deadline (in seconds) of each call to the demo server
+    app.add_config_value('demo_fields_timeout', 10, '')
+    # number of times a timed out or failed call is retried
+    app.add_config_value('demo_fields_retries', 2, '')
+    # maximum time (in seconds) a demo:fields directive waits for its
+    # fields, in case a fetch never completes
+    app.add_config_value('demo_fields_wait_timeout', 300, '')
+    # number of idle keep-alive connections to the demo server kept around,
+    # and how long (in seconds) they are kept
+    app.add_config_value('demo_fields_pool_size', 4, '')
+    app.add_config_value('demo_fields_pool_idle_timeout', 30, '')
+    app.connect('builder-inited', open_cache)
+    app.connect('builder-inited', start_engine)
+    app.connect('env-before-read-docs', prefetch_fields)
+    app.connect('build-finished', stop_engine)
+    app.connect('build-finished', close_cache)
+    app.connect('build-finished', report_telemetry)
+    # the engine and cache are per-process, directives of a parallel read
+    # start their own (see _submit) and their telemetry is not reported
+    return {
+        'parallel_read_safe': True,
+        'parallel_write_safe': True,
+    }
 
 class Fields(Directive):
     """Fetches and lists the fields linked to a specific action.
@@ -50,12 +90,18 @@ class Fields(Directive):
         self.future_fields = self._get_fields(xid, options.get('view') or 'form')
 
     def run(self):
+        start = time.time()
         try:
-            fields = self.future_fields.get(timeout=30)
-        except Queue.Empty:
+            # the engine enforces deadlines on every call and resolves the
+            # fetches of failed batches, this is only a safeguard
+            fields = self.future_fields.result(
+                timeout=self.state.document.settings.env.config.demo_fields_wait_timeout)
+        except concurrent.futures.TimeoutError:
             return [self.state_machine.reporter.error(
                 "Timed out while fetching fields related to action [%s]" % self.arguments[0]
             )]
+        finally:
+            telemetry.count('wait', time.time() - start)
         if fields is None:
             return [self.state_machine.reporter.warning(
                 "Could not find any field related to the action [%s]" % self.arguments[0]
@@ -85,9 +131,22 @@ class Fields(Directive):
         ))]
 
     def _get_fields(self, xid, view='form'):
-        q = Queue.Queue(1)
-        _submit(q, xid, view)
-        return q
+        # only the first directive gets the prefetched result, the next ones
+        # should find it in the cache
+        future = prefetched.pop((xid, view), None)
+        # the fetches still pending when a parallel build forked its readers
+        # never complete in the readers
+        if future is not None and (future.done() or os.getpid() == MAIN_PID):
+            return future
+        offline = self.state.document.settings.env.config.demo_fields_offline
+        if cache is not None:
+            hit, fields = cache.get(xid, view, stale=offline)
+            if hit:
+                telemetry.count('cache hits')
+                return _resolved(fields)
+        if offline:
+            return _resolved("not available in the cache (offline mode)")
+        return _submit(xid, view)
 
 class Action(Directive):
     required_arguments = 1
@@ -115,93 +174,637 @@ class OdooDemoDomain(Domain):
         'action': Action,
     }
 
-FETCH_THREADS = 4
-launcher_lock = threading.Lock()
-launcher = None
-work_queue = Queue.Queue()
-Task = collections.namedtuple('Task', 'result xid view')
-def _submit(result_queue, xid, view='form'):
-    global launcher
-    # enqueue task before checking launcher, that way if the launcher
-    # is already started (likely) a worker can immediately get to work
-    work_queue.put(Task(result_queue, xid, view))
-
-    with launcher_lock:
-        if launcher is None:
-            launcher = threading.Thread(target=_launcher, name="Fetch threads launcher")
-            launcher.daemon = True
-            launcher.start()
-
-def _launcher():
-    try:
-        info = xmlrpclib.ServerProxy('https://demo.odoo.com/start').start()
-    except xmlrpclib.Fault as e:
-        threading.Thread(
-            target=_fault_requests,
-            args=["Demo start() failed: %s" % e.faultString],
-            name="fields_get login failed").start()
+    def merge_domaindata(self, docnames, otherdata):
+        # no data to merge from parallel readers
+        pass
+
+class FieldsCache(object):
+    """Persistent store of demo:fields results, kept next to the doctrees
+    so they survive between builds.
+
+    Entries are keyed by a digest of (xid, view, version), expire after
+    ``ttl`` seconds and only the ``size`` most recently fetched entries are
+    kept when the cache is closed.
+    """
+    def __init__(self, path, version, ttl, size):
+        self.version = version
+        self.ttl = ttl
+        self.size = size
+        self.path = path
+        self.pid = None
+        self.connection()
+
+    def connection(self):
+        # neither the sqlite connection nor the lock can be shared with
+        # forked processes (e.g. the readers of a parallel build)
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            # written to by the fetcher threads
+            self.lock = threading.Lock()
+            self.db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS fields ("
+                " key TEXT PRIMARY KEY,"
+                " stamp REAL NOT NULL,"
+                " value TEXT NOT NULL)")
+        return self.db
+
+    def key(self, xid, view):
+        return hashlib.sha1(json.dumps(
+            [xid, view, self.version]).encode('utf-8')).hexdigest()
+
+    def get(self, xid, view, stale=False):
+        """ Returns a ``(hit, fields)`` pair, if ``stale`` expired entries
+        are returned as well
+        """
+        db = self.connection()
+        with self.lock:
+            row = db.execute(
+                "SELECT stamp, value FROM fields WHERE key = ?",
+                [self.key(xid, view)]).fetchone()
+        if row is None:
+            return False, None
+        stamp, value = row
+        if not stale and self.ttl and time.time() - stamp > self.ttl:
+            return False, None
+        return True, json.loads(value, object_pairs_hook=collections.OrderedDict)
+
+    def set(self, xid, view, fields):
+        db = self.connection()
+        with self.lock, db:
+            db.execute(
+                "INSERT OR REPLACE INTO fields (key, stamp, value) VALUES (?, ?, ?)",
+                [self.key(xid, view), time.time(), json.dumps(fields)])
+
+    def close(self):
+        with self.lock, self.db:
+            if self.ttl:
+                self.db.execute(
+                    "DELETE FROM fields WHERE stamp < ?",
+                    [time.time() - self.ttl])
+            self.db.execute(
+                "DELETE FROM fields WHERE key NOT IN ("
+                " SELECT key FROM fields ORDER BY stamp DESC LIMIT ?)",
+                [self.size])
+        self.db.close()
+
+cache = None
+def open_cache(app):
+    global cache
+    os.makedirs(app.doctreedir, exist_ok=True)
+    cache = FieldsCache(
+        os.path.join(app.doctreedir, 'demo_fields.db'),
+        app.config.version,
+        app.config.demo_fields_cache_ttl,
+        app.config.demo_fields_cache_size,
+    )
+
+def close_cache(app, exception):
+    global cache
+    if cache is not None:
+        cache.close()
+        cache = None
+
+FIELDS_RE = re.compile(
+    r'^(?P<indent>[ \t]*)\.\.[ \t]+demo:fields::[ \t]*(?P<xid>\S+)[ \t]*\n'
+    r'(?P<options>(?:(?P=indent)[ \t]+:[\w-]+:.*\n?)*)',
+    re.MULTILINE)
+VIEW_RE = re.compile(r':view:[ \t]*(\S+)')
+
+class Telemetry(object):
+    """Collects counters, queue depth samples and per-fetch latencies of
+    the demo:fields fetches over a build, written out by
+    :func:`report_telemetry`
+    """
+    def __init__(self):
+        self.start = time.time()
+        self.lock = threading.Lock()
+        self.counters = collections.Counter()
+        # [(seconds since start, pending fetches)]
+        self.queue_depth = []
+        # {(xid, view): {phase: seconds}}
+        self.latencies = collections.defaultdict(dict)
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] += value
+
+    def depth(self, pending):
+        with self.lock:
+            self.queue_depth.append((round(time.time() - self.start, 3), pending))
+
+    def latency(self, keys, phase, seconds):
+        with self.lock:
+            for key in keys:
+                self.latencies[key][phase] = seconds
+
+    def summary(self):
+        phases = collections.defaultdict(list)
+        for latency in self.latencies.values():
+            for phase, seconds in latency.items():
+                phases[phase].append(seconds)
+        return {
+            'counters': dict(self.counters),
+            'queue_depth': self.queue_depth,
+            'phases': {
+                phase: {
+                    'count': len(values),
+                    'p50': _percentile(values, 50),
+                    'p95': _percentile(values, 95),
+                    'p99': _percentile(values, 99),
+                    'max': max(values),
+                }
+                for phase, values in phases.items()
+            },
+            'fetches': {
+                '%s/%s' % key: latency
+                for key, latency in sorted(self.latencies.items())
+            },
+        }
+
+def _percentile(values, p):
+    """ Nearest-rank percentile """
+    values = sorted(values)
+    return values[max(0, -(-len(values) * p // 100) - 1)]
+
+telemetry = Telemetry()
+def report_telemetry(app, exception):
+    """ Writes the fetch telemetry as JSON in the doctree directory and
+    logs a summary, so fetch-bound builds stand out in the build logs
+    """
+    global telemetry
+    t, telemetry = telemetry, Telemetry()
+    if not (t.counters or t.latencies):
         return
-    url, db, username, password = \
-        info['host'], info['database'], info['user'], info['password']
-
-    uid = xmlrpclib.ServerProxy('{}/xmlrpc/2/common'.format(url))\
-                   .authenticate(db, username, password, {})
-
-    for i in range(FETCH_THREADS):
-        # daemon because Launcher is daemon
-        threading.Thread(target=_fetch_fields, kwargs={
-            'db': db,
-            'uid': uid,
-            'password': password,
-            'url': '{}/xmlrpc/2/object'.format(url)
-        }, name="fields_get fetcher thread %d/%d" % (i, FETCH_THREADS)).start()
-
-def _fault_requests(error):
-    while True:
-        task = work_queue.get()
-        task.result.put(error)
-        work_queue.task_done()
-
-def _fetch_fields(url, db, uid, password):
-    server = xmlrpclib.ServerProxy(url)
-    while True:
-        task = work_queue.get()
-
-        # resolve xid
-        model, id_ = server.execute_kw(
-            db, uid, password,
-            'ir.model.data', 'xmlid_to_res_model_res_id', [task.xid])
-        if not id_: # didn't find xid
-            result = None
-        elif model != 'ir.actions.act_window': # we only handle action windows, rest is unknown
-            result = None
+    summary = t.summary()
+    with open(os.path.join(app.doctreedir, 'demo_fields_telemetry.json'), 'w') as f:
+        json.dump(summary, f, indent=2, sort_keys=True)
+
+    counters = t.counters
+    logger.info(
+        "demo:fields: %d cache hits, %d fetched, %d failed, %d call timeouts, "
+        "%d retries, max %d pending",
+        counters['cache hits'], len(t.latencies), counters['failures'],
+        counters['timeouts'], counters['retries'],
+        max((depth for _, depth in t.queue_depth), default=0))
+    if counters['prefetched']:
+        logger.info(
+            "demo:fields: prefetched %d actions, waited %.2fs on %.2fs of "
+            "fetching (%.0f%% of the fetch time hidden by the prefetch)",
+            counters['prefetched'], counters['wait'], counters['fetch'],
+            100 * max(0, 1 - counters['wait'] / counters['fetch']) if counters['fetch'] else 0)
+    if counters['connections opened']:
+        logger.info(
+            "demo:fields: opened %d connections, reused %d",
+            counters['connections opened'], counters['connections reused'])
+    if summary['phases']:
+        logger.info("%-16s %6s %8s %8s %8s %8s", "phase", "count", "p50", "p95", "p99", "max")
+        for phase in ['resolve', 'read', 'fields_view_get', 'total']:
+            if phase in summary['phases']:
+                row = summary['phases'][phase]
+                logger.info(
+                    "%-16s %6d %7.3fs %7.3fs %7.3fs %7.3fs", phase, row['count'],
+                    row['p50'], row['p95'], row['p99'], row['max'])
+
+prefetched = {}
+def prefetch_fields(app, env, docnames):
+    """ Scans the documents about to be read for demo:fields directives
+    and submits all uncached fetches upfront, so the network latency overlaps
+    with parsing instead of blocking each directive in turn
+    """
+    if app.config.demo_fields_offline:
+        return
+    for docname in docnames:
+        with open(env.doc2path(docname), encoding=app.config.source_encoding) as f:
+            source = f.read()
+        if 'demo:fields' not in source:
+            continue
+        for match in FIELDS_RE.finditer(source):
+            view = VIEW_RE.search(match.group('options'))
+            key = match.group('xid'), view.group(1) if view else 'form'
+            if key in prefetched or (cache is not None and cache.get(*key)[0]):
+                continue
+            prefetched[key] = _submit(*key)
+            telemetry.count('prefetched')
+
+FETCH_BATCH_SIZE = 50
+# base delay (in seconds) before retrying a failed call, doubled on every
+# attempt and jittered
+RETRY_BACKOFF = 0.5
+DEMO_START_URL = 'https://demo.odoo.com/start'
+Task = collections.namedtuple('Task', 'result xid view submitted')
+
+# process running the build, as opposed to the processes forked by a
+# parallel build
+MAIN_PID = os.getpid()
+
+engine = None
+engine_options = {}
+def start_engine(app):
+    global engine
+    if app.config.demo_fields_offline:
+        return
+    engine_options.update(
+        concurrency=app.config.demo_fields_concurrency,
+        timeout=app.config.demo_fields_timeout,
+        retries=app.config.demo_fields_retries,
+        pool_size=app.config.demo_fields_pool_size,
+        pool_idle_timeout=app.config.demo_fields_pool_idle_timeout,
+    )
+    engine = FetchEngine(**engine_options)
+
+def stop_engine(app, exception):
+    global engine
+    # the prefetches no directive used are cancelled with the engine
+    prefetched.clear()
+    if engine is not None:
+        engine.close()
+        for name, value in engine.pool.stats.items():
+            telemetry.count('connections %s' % name, value)
+        engine = None
+
+def _submit(xid, view='form'):
+    global engine
+    # the engine's thread does not survive forking, each reader of a
+    # parallel build needs its own
+    if engine.pid != os.getpid():
+        engine = FetchEngine(**engine_options)
+    return engine.submit(xid, view)
+
+def _resolved(value):
+    future = concurrent.futures.Future()
+    future.set_result(value)
+    return future
+
+class ConnectionPool(object):
+    """Keeps up to ``size`` idle keep-alive connections per host around, for
+    reuse by later calls, idle connections are dropped after
+    ``idle_timeout`` seconds.
+    """
+    def __init__(self, size=4, idle_timeout=30):
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.lock = threading.Lock()
+        self.idle = collections.defaultdict(list)
+        self.stats = collections.Counter()
+
+    def acquire(self, key):
+        """ Returns an idle connection for ``key`` or ``None``
+        """
+        now = time.time()
+        with self.lock:
+            connections = self.idle[key]
+            while connections:
+                conn, last_used = connections.pop()
+                if now - last_used < self.idle_timeout:
+                    self.stats['reused'] += 1
+                    return conn
+                conn.close()
+        return None
+
+    def opened(self):
+        with self.lock:
+            self.stats['opened'] += 1
+
+    def release(self, key, conn):
+        with self.lock:
+            connections = self.idle[key]
+            if len(connections) < self.size:
+                connections.append((conn, time.time()))
+                return
+        conn.close()
+
+    def close(self):
+        with self.lock:
+            for connections in self.idle.values():
+                for conn, _ in connections:
+                    conn.close()
+            self.idle.clear()
+
+class _PooledMixin(object):
+    """ Transport taking its connection from a shared :class:`ConnectionPool`
+    for each request and giving it back once the response has been read.
+    Connections which failed are closed by the transport and never return
+    to the pool.
+    """
+    pool = None
+    timeout = None
+    def request(self, host, handler, request_body, verbose=False):
+        key = type(self), host
+        conn = self.pool.acquire(key)
+        if conn is not None:
+            _, self._extra_headers, _ = self.get_host_info(host)
+            self._connection = host, conn
+        try:
+            # retries once if a reused connection was closed by the server
+            return super(_PooledMixin, self).request(host, handler, request_body, verbose)
+        finally:
+            _, conn = self._connection
+            self._connection = (None, None)
+            if conn is not None:
+                self.pool.release(key, conn)
+
+    def make_connection(self, host):
+        if self._connection[1] is None or self._connection[0] != host:
+            self.pool.opened()
+        conn = super(_PooledMixin, self).make_connection(host)
+        # make sure a call abandoned by the engine eventually frees its
+        # worker thread
+        conn.timeout = self.timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(self.timeout)
+        return conn
+class Transport(_PooledMixin, xmlrpclib.Transport): pass
+class SafeTransport(_PooledMixin, xmlrpclib.SafeTransport): pass
+
+class FetchEngine(object):
+    """Fetches demo:fields results on an asyncio loop running in a
+    background thread.
+
+    Pending fetches are grouped in batches of up to ``FETCH_BATCH_SIZE``, at
+    most ``concurrency`` RPC calls are in flight at once, each call has
+    ``timeout`` seconds to complete and failed calls are retried up to
+    ``retries`` times with a jittered exponential backoff.
+    """
+    def __init__(self, concurrency=4, timeout=10, retries=2,
+                 pool_size=4, pool_idle_timeout=30, start_url=DEMO_START_URL):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.start_url = start_url
+        self.pid = os.getpid()
+        self.session = None
+        self.batches = set()
+        # shared by all the transports so calls reuse each other's connections
+        self.pool = ConnectionPool(pool_size, pool_idle_timeout)
+        self.loop = asyncio.new_event_loop()
+        # xmlrpc is blocking, so calls are run in a thread pool
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            concurrency, thread_name_prefix="demo:fields fetcher")
+        self.thread = threading.Thread(
+            target=self._run, name="demo:fields fetch loop", daemon=True)
+        self.thread.start()
+
+    def submit(self, xid, view='form'):
+        """ Schedules fetching the fields of ``view`` for the action ``xid``
+
+        :returns: a :class:`concurrent.futures.Future` resolving to the
+                  fields, ``None`` if the action was not found or an error
+                  message
+        """
+        future = concurrent.futures.Future()
+        self.loop.call_soon_threadsafe(
+            self._enqueue, Task(future, xid, view, time.time()))
+        return future
+
+    def close(self):
+        """ Cancels all pending fetches and stops the loop and its thread
+        """
+        if self.loop.is_closed():
+            return
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.executor.shutdown(wait=False)
+        self.pool.close()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.queue = asyncio.Queue()
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.dispatcher = self.loop.create_task(self._dispatch())
+        self.loop.run_forever()
+
+    def _enqueue(self, task):
+        self.queue.put_nowait(task)
+        telemetry.depth(self.queue.qsize())
+
+    async def _shutdown(self):
+        tasks = [self.dispatcher] + list(self.batches)
+        if self.session is not None:
+            tasks.append(self.session)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        while not self.queue.empty():
+            self.queue.get_nowait().result.cancel()
+
+    async def _dispatch(self):
+        while True:
+            tasks = [await self.queue.get()]
+            while len(tasks) < FETCH_BATCH_SIZE and not self.queue.empty():
+                tasks.append(self.queue.get_nowait())
+            telemetry.depth(self.queue.qsize())
+            batch = self.loop.create_task(self._run_batch(tasks))
+            self.batches.add(batch)
+            batch.add_done_callback(self.batches.discard)
+
+    async def _run_batch(self, tasks):
+        start = time.time()
+        try:
+            call = await asyncio.shield(self._login())
+            results = await _fetch_batch(call, tasks)
+        except asyncio.CancelledError:
+            for task in tasks:
+                task.result.cancel()
+            raise
+        except asyncio.TimeoutError:
+            telemetry.count('failures', len(tasks))
+            for task in tasks:
+                task.result.set_exception(concurrent.futures.TimeoutError())
+            return
+        except (xmlrpclib.Error, IOError) as e:
+            telemetry.count('failures', len(tasks))
+            error = e.faultString if isinstance(e, xmlrpclib.Fault) else str(e)
+            results = {(task.xid, task.view): error for task in tasks}
+        except Exception as e:
+            # unexpected response (e.g. malformed start() info or view
+            # arch), the fetches must still be resolved or the directives
+            # waiting on them would block
+            telemetry.count('failures', len(tasks))
+            error = '%s: %s' % (type(e).__name__, e)
+            results = {(task.xid, task.view): error for task in tasks}
         else:
-            action = server.execute_kw(db, uid, password, model, 'read', [id_, ['res_model', 'views']])
-            view_id = next((id_ for type, id_ in action[0]['views'] if type == task.view), False)
-            fvg = server.execute_kw(
-                db, uid, password,
-                action[0]['res_model'], 'fields_view_get', [], {
-                    'view_id': view_id,
-                    'view_type': task.view
-                })
-            result = collections.OrderedDict()
-            # reorder fields to be in view order, and add @help from view if any
-            arch = ET.fromstring(fvg['arch'])
-            for node in arch.iter(tag='field'):
-                field = node.get('name')
-
-                result[field] = fvg['fields'][field]
-                # bit trashy but should work well enough to update
-                # @string and @help
-                result[field].update(node.attrib)
-                if node.get('nolabel'):
-                    # native @string suppressed, look for <label
-                    # for=@name>.  invisible means a field could have
-                    # multiple <label> but that's basically impossible
-                    # to handle so jusr get the first one
-                    label = arch.find(".//label[@for='%s']" % field)
-                    if label is not None:
-                        result[field]['string'] = label.get('string')
-
-        task.result.put(result)
-        work_queue.task_done()
+            if cache is not None:
+                for (xid, view), result in results.items():
+                    cache.set(xid, view, result)
+        now = time.time()
+        telemetry.count('fetch', now - start)
+
+        for task in tasks:
+            telemetry.latency([(task.xid, task.view)], 'total', now - task.submitted)
+            if not task.result.done():
+                task.result.set_result(results[task.xid, task.view])
+
+    def _login(self):
+        # all batches share the same session, and the same failure if
+        # the login fails
+        if self.session is None:
+            self.session = self.loop.create_task(self._start())
+        return self.session
+
+    async def _start(self):
+        try:
+            info = await self._call(self._proxy(self.start_url).start)
+        except xmlrpclib.Fault as e:
+            raise xmlrpclib.Fault(e.faultCode, "Demo start() failed: %s" % e.faultString)
+        url, db, username, password = \
+            info['host'], info['database'], info['user'], info['password']
+
+        uid = await self._call(
+            self._proxy('{}/xmlrpc/2/common'.format(url)).authenticate,
+            db, username, password, {})
+
+        object_url = '{}/xmlrpc/2/object'.format(url)
+        def execute_kw(*args):
+            return self._proxy(object_url).execute_kw(db, uid, password, *args)
+        async def call(model, method, *args, **kwargs):
+            return await self._call(execute_kw, model, method, list(args), kwargs)
+        return call
+
+    def _proxy(self, url):
+        transport = SafeTransport() if url.startswith('https:') else Transport()
+        transport.pool = self.pool
+        transport.timeout = self.timeout
+        return xmlrpclib.ServerProxy(url, transport=transport)
+
+    async def _call(self, fn, *args):
+        """ Runs the blocking ``fn(*args)`` in the executor, within the
+        deadline and retrying on timeouts and network errors
+        """
+        for attempt in itertools.count():
+            try:
+                async with self.semaphore:
+                    return await self._run_call(fn, *args)
+            except xmlrpclib.Fault:
+                # application error, retrying won't help
+                raise
+            except (asyncio.TimeoutError, xmlrpclib.ProtocolError, IOError) as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    telemetry.count('timeouts')
+                if attempt >= self.retries:
+                    raise
+            telemetry.count('retries')
+            await asyncio.sleep(RETRY_BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5))
+
+    async def _run_call(self, fn, *args):
+        """ Runs ``fn(*args)`` in the executor, within the deadline counted
+        from when a worker thread starts running it: the threads of abandoned
+        calls are only freed by their socket timeout, calls queued behind
+        them must not time out before reaching the server
+        """
+        started = self.loop.create_future()
+        def run():
+            self.loop.call_soon_threadsafe(
+                lambda: started.done() or started.set_result(None))
+            return fn(*args)
+        call = self.loop.run_in_executor(self.executor, run)
+        try:
+            await asyncio.wait([started, call], return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            call.cancel()
+            raise
+        return await asyncio.wait_for(call, self.timeout)
+
+async def _fetch_batch(call, tasks):
+    """ Fetches the fields of all ``tasks`` in a fixed number of round trips
+    (one to resolve all xids, one to read all actions, one per model to load
+    the views), rather than three per task.
+
+    :param call: ``await call(model, method, *args, **kwargs)`` executes an
+                 RPC call against the demo server
+    :returns: a dict of (xid, view) to the corresponding fields or ``None``
+    """
+    results = dict.fromkeys((task.xid, task.view) for task in tasks)
+
+    # resolve all xids at once
+    names = {tuple(xid.split('.', 1)) for xid, _ in results if '.' in xid}
+    if not names:
+        return results
+    domain = ['|'] * (len(names) - 1)
+    for module, name in names:
+        domain += ['&', ('module', '=', module), ('name', '=', name)]
+    start = time.time()
+    data = await call('ir.model.data', 'search_read', domain, ['module', 'name', 'model', 'res_id'])
+    telemetry.latency(results, 'resolve', time.time() - start)
+    action_ids = {
+        '%s.%s' % (d['module'], d['name']): d['res_id']
+        for d in data
+        # we only handle action windows, rest is unknown
+        if d['model'] == 'ir.actions.act_window'
+    }
+    if not action_ids:
+        return results
+
+    start = time.time()
+    actions = {
+        action['id']: action
+        for action in await call('ir.actions.act_window', 'read', list(set(action_ids.values())), ['res_model', 'views'])
+    }
+    telemetry.latency(
+        [(xid, view) for xid, view in results if xid in action_ids],
+        'read', time.time() - start)
+
+    # group views to load per model, a model can only load one view of each
+    # type per call so conflicting views are deferred to a later round
+    rounds = []
+    for xid, view in results:
+        action = actions.get(action_ids.get(xid))
+        if action is None:
+            continue
+        view_id = next((id_ for id_, type in action['views'] if type == view), False)
+        for views in rounds:
+            requested = views.setdefault(action['res_model'], {})
+            if requested.get(view, view_id) == view_id:
+                requested[view] = view_id
+                break
+        else:
+            rounds.append({action['res_model']: {view: view_id}})
+        key = action['res_model'], view, view_id
+        results[xid, view] = key
+
+    fvgs = {}
+    durations = {}
+    async def load_views(model, requested):
+        start = time.time()
+        loaded = await call(model, 'load_views', [
+            [view_id, view] for view, view_id in requested.items()
+        ])
+        for view, view_id in requested.items():
+            fvgs[model, view, view_id] = loaded['fields_views'][view]
+            durations[model, view, view_id] = time.time() - start
+    for views in rounds:
+        await asyncio.gather(*(
+            load_views(model, requested)
+            for model, requested in views.items()
+        ))
+    for k, key in results.items():
+        if key is not None:
+            telemetry.latency([k], 'fields_view_get', durations[key])
+
+    return {
+        k: _view_fields(fvgs[key]) if key is not None else None
+        for k, key in results.items()
+    }
+
+def _view_fields(fvg):
+    result = collections.OrderedDict()
+    # reorder fields to be in view order, and add @help from view if any
+    arch = ET.fromstring(fvg['arch'])
+    for node in arch.iter(tag='field'):
+        field = node.get('name')
+
+        result[field] = fvg['fields'][field]
+        # bit trashy but should work well enough to update
+        # @string and @help
+        result[field].update(node.attrib)
+        if node.get('nolabel'):
+            # native @string suppressed, look for <label
+            # for=@name>.  invisible means a field could have
+            # multiple <label> but that's basically impossible
+            # to handle so jusr get the first one
+            label = arch.find(".//label[@for='%s']" % field)
+            if label is not None:
+                result[field]['string'] = label.get('string')
+    return result
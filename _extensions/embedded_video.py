@@ -63,4 +63,8 @@ class Vimeo(IframeVideo):
 
 def setup(builder):
     directives.register_directive('youtube', Youtube)
-    directives.register_directive('vimeo', Vimeo)
\ No newline at end of file
+    directives.register_directive('vimeo', Vimeo)
+    return {
+        'parallel_read_safe': True,
+        'parallel_write_safe': True,
+    }
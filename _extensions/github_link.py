@@ -71,6 +71,10 @@ def setup(app):
             os.path.relpath(obj_source_path, project_root),
             line)
     app.config.linkcode_resolve = linkcode_resolve
+    return {
+        'parallel_read_safe': True,
+        'parallel_write_safe': True,
+    }
 
 def make_github_link(app, path, line=None, mode="blob"):
     config = app.config
@@ -32,6 +32,10 @@ def setup(app):
                        ('s', strikethrough), ('u', underline), ('small', small),
                        ('kbd', kbd), ('var', var), ('samp', samp)]:
         addnode(app, node, name)
+    return {
+        'parallel_read_safe': True,
+        'parallel_write_safe': True,
+    }
 
 
 class div(nodes.General, nodes.Element): pass
@@ -126,3 +130,7 @@ class HtmlDomain(Domain):
         'var': makerole(var),
         'samp': makerole(samp),
     }
+
+    def merge_domaindata(self, docnames, otherdata):
+        # no data to merge from parallel readers
+        pass
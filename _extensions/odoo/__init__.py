@@ -1,6 +1,15 @@
 # -*- coding: utf-8 -*-
 
+from . import assets
+from . import cards
+from . import catalogs
+from . import compress
+from . import gettext
+from . import highlighting
+from . import images
+from . import purge
 from . import pygments_override
+from . import scripts
 from . import switcher
 from . import translator
 
@@ -12,6 +21,10 @@ except ImportError:
 
 import sphinx.builders.html
 from docutils import nodes
+from docutils.core import Publisher, publish_parts
+from docutils.io import DocTreeInput
+from sphinx.util.docutils import new_document
+from sphinx.writers.html import HTMLWriter
 def setup(app):
     if hasattr(app, 'set_translator'):
         app.set_translator('html', translator.BootstrapTranslator)
@@ -22,10 +35,23 @@ def setup(app):
         app.config.html_translator_class = 'odoo.translator.BootstrapTranslator'
 
     switcher.setup(app)
+    assets.setup(app)
+    purge.setup(app)
+    cards.setup(app)
+    catalogs.setup(app)
+    gettext.setup(app)
+    highlighting.setup(app)
+    images.setup(app)
+    scripts.setup(app)
+    compress.setup(app)
     app.add_config_value('odoo_cover_default', None, 'env')
     app.add_config_value('odoo_cover_external', {}, 'env')
     app.add_config_value('odoo_cover_default_external', lambda conf: conf.odoo_cover_default, 'env')
     app.connect('html-page-context', update_meta)
+    return {
+        'parallel_read_safe': True,
+        'parallel_write_safe': True,
+    }
 
 def update_meta(app, pagename, templatename, context, doctree):
     if not context.get('meta'):  # context['meta'] can be None
@@ -147,4 +173,37 @@ def render_partial(old_partial, self, node):
                     n['classes'].append('ripple')
         else:
             node.clear()
-    return old_partial(self, node)
+    elif isinstance(node, nodes.title):
+        # the titles of the environment are rendered for the page title,
+        # breadcrumbs and prev/next links of many pages, only render each
+        # once per build
+        titles = self.__dict__.setdefault('odoo_titles', {})
+        cached = titles.get(id(node))
+        if cached is None or cached[0] is not node:
+            cached = titles[id(node)] = (node, _render_partial(self, node))
+        return cached[1]
+    return _render_partial(self, node)
+
+partial_settings = None
+def _render_partial(builder, node):
+    """ Same as ``StandaloneHTMLBuilder.render_partial``, but reuses the
+    docutils settings: creating them (and their option parser) is most of
+    the cost of rendering a partial.
+    """
+    global partial_settings
+    if node is None:
+        return {'fragment': ''}
+    doc = new_document('<partial node>')
+    doc.append(node)
+
+    writer = HTMLWriter(builder)
+    if partial_settings is None:
+        publisher = Publisher(writer=writer, source_class=DocTreeInput)
+        publisher.set_components('doctree', 'restructuredtext', None)
+        publisher.process_programmatic_settings(None, {'output_encoding': 'unicode'}, None)
+        partial_settings = publisher.settings
+    return publish_parts(reader_name='doctree',
+                         writer=writer,
+                         source_class=DocTreeInput,
+                         settings=partial_settings,
+                         source=doc)
@@ -0,0 +1,155 @@
+"""
+Fingerprinted theme assets.
+
+At ``builder-inited``, the scripts of the theme are concatenated into
+``theme.js``. The stylesheet is compiled from its LESS sources when ``lessc``
+is available, otherwise the ``style.css`` compiled by the Makefile is used.
+Both are minified when rjsmin and rcssmin are installed, and cached in
+``odoo_asset_cache`` (``assets`` in the doctree directory by default, which
+all languages of the documentation can share) by the hash of their sources. They are written to
+``_static`` with the hash of their content in their name, and listed in
+``_static/assets.json``. ``pathto`` resolves their original names through
+this manifest, so they can be served with immutable cache headers.
+"""
+import glob
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+
+from sphinx.util import logging
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+logger = logging.getLogger(__name__)
+
+STATIC = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+# concatenated in this order, jquery.noconflict gives $ back to Sphinx's jQuery
+SCRIPTS = ['jquery.min.js', 'bootstrap.js', 'doc.js', 'jquery.noconflict.js']
+
+# original static path: fingerprinted static path
+manifest = {}
+
+def setup(app):
+    # manifest of the build, set by build_assets so the pages are rewritten
+    # when an asset changes
+    app.add_config_value('odoo_assets', {}, 'html')
+    # directory of the built assets, defaults to assets in the doctree
+    # directory
+    app.add_config_value('odoo_asset_cache', None, '')
+    app.connect('builder-inited', build_assets)
+    app.connect('html-page-context', resolve_assets)
+
+def build_assets(app):
+    manifest.clear()
+    if app.builder.format != 'html':
+        return
+
+    outdir = os.path.join(app.builder.outdir, '_static')
+    os.makedirs(outdir, exist_ok=True)
+    cache = app.config.odoo_asset_cache or os.path.join(app.doctreedir, 'assets')
+    os.makedirs(cache, exist_ok=True)
+
+    sources = [os.path.join(STATIC, name) for name in SCRIPTS]
+    _add_asset(
+        cache, outdir, 'theme.js', sources, [b'rjsmin' if rjsmin else b''],
+        _build_script)
+
+    lessc = shutil.which('lessc')
+    if lessc:
+        sources = sorted(glob.glob(os.path.join(STATIC, '**', '*.less'), recursive=True))
+    else:
+        logger.info("lessc not found, using the compiled style.css")
+        sources = [os.path.join(STATIC, 'style.css')]
+    # the pages which are not rewritten link to the stylesheet purged by the
+    # previous build, it is only removed once the new one is purged
+    _add_asset(
+        cache, outdir, 'style.css', sources, [b'rcssmin' if rcssmin else b''],
+        lambda sources: _build_style(lessc, sources), clean=False)
+
+    write_manifest(app)
+
+    app.config.odoo_assets = dict(manifest)
+    if hasattr(app.builder, 'create_build_info'):
+        app.builder.build_info = app.builder.create_build_info()
+
+def write_manifest(app):
+    with open(os.path.join(app.builder.outdir, '_static', 'assets.json'), 'w') as f:
+        json.dump(manifest, f, indent=0, sort_keys=True)
+
+def resolve_assets(app, pagename, templatename, context, doctree):
+    if not manifest:
+        return
+    pathto = context['pathto']
+    def resolve(otheruri, *args, **kwargs):
+        return pathto(manifest.get(otheruri, otheruri), *args, **kwargs)
+    context['pathto'] = resolve
+
+def _add_asset(cache, outdir, name, sources, salt, build, clean=True):
+    """ Writes the fingerprinted ``name`` built from ``sources`` to
+    ``outdir`` and adds it to the manifest, only builds it if the sources
+    changed since it was cached. Unless ``clean`` is false, the previous
+    versions of ``name`` are removed from ``outdir``
+    """
+    digest = hashlib.sha1(b''.join(salt))
+    for source in sources:
+        with open(source, 'rb') as f:
+            digest.update(f.read())
+    base, ext = os.path.splitext(name)
+    cached = os.path.join(cache, '%s.%s%s' % (base, digest.hexdigest(), ext))
+    if not os.path.isfile(cached):
+        content = build(sources)
+        tmp = '%s.%d.tmp' % (cached, os.getpid())
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(tmp, cached)
+        logger.info(
+            "built %s from %d files: %.1fkB -> %.1fkB", name, len(sources),
+            sum(map(os.path.getsize, sources)) / 1024, os.path.getsize(cached) / 1024)
+    # only keep the version built from the current sources in the cache
+    versions = re.compile(r'%s\.[0-9a-f]{40}%s$' % (re.escape(base), re.escape(ext)))
+    for entry in os.listdir(cache):
+        if versions.match(entry) and entry != os.path.basename(cached):
+            os.unlink(os.path.join(cache, entry))
+
+    with open(cached, 'rb') as f:
+        fingerprint = hashlib.sha1(f.read()).hexdigest()[:10]
+    filename = '%s.%s%s' % (base, fingerprint, ext)
+    target = os.path.join(outdir, filename)
+    if not os.path.isfile(target):
+        shutil.copyfile(cached, target)
+    # remove the files of the previous versions of the asset
+    if clean:
+        for stale in glob.glob(os.path.join(outdir, '%s.*%s' % (base, ext))):
+            if os.path.basename(stale) != filename:
+                os.unlink(stale)
+    manifest['_static/' + name] = '_static/' + filename
+
+def _build_script(sources):
+    scripts = []
+    for source in sources:
+        with open(source, encoding='utf-8') as f:
+            scripts.append(f.read())
+    # a script may not end with a semicolon or a newline
+    content = ';\n'.join(scripts)
+    return rjsmin.jsmin(content) if rjsmin else content
+
+def _build_style(lessc, sources):
+    if lessc:
+        content = subprocess.run(
+            [lessc, os.path.join(STATIC, 'style.less')],
+            stdout=subprocess.PIPE, check=True, universal_newlines=True,
+        ).stdout
+    else:
+        with open(sources[0], encoding='utf-8') as f:
+            content = f.read()
+    return rcssmin.cssmin(content) if rcssmin else content
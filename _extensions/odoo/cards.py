@@ -0,0 +1,63 @@
+"""
+Index of the cards rendered for toctree entries on category pages (see
+``BootstrapTranslator.visit_toctree``).
+
+The index is stored on the environment and only updated for the documents
+which were (re)read, so rendering a toctree just formats HTML.
+"""
+import collections
+import os.path
+
+from sphinx import addnodes, util
+
+from urllib.request import url2pathname
+
+# title: cleaned up title of the document
+# types: CSS classes of the document's section
+# banner: path of the card's banner relative to the output root, or None
+# children: [(title, docname)] entries of the document's toctree, None if
+#           the document has no toctree
+Card = collections.namedtuple('Card', 'title types banner children')
+
+def setup(app):
+    app.connect('env-purge-doc', purge_card)
+    app.connect('env-updated', update_cards)
+
+def purge_card(app, env, docname):
+    getattr(env, 'odoo_cards', {}).pop(docname, None)
+
+def update_cards(app, env):
+    if not hasattr(env, 'odoo_cards'):
+        env.odoo_cards = {}
+    cards = env.odoo_cards
+    for docname in env.found_docs:
+        if docname in cards or docname not in env.tocs:
+            continue
+        meta = env.metadata[docname]
+        toc = next(iter(env.tocs[docname].traverse(addnodes.toctree)), None)
+        cards[docname] = Card(
+            title=util.nodes.clean_astext(env.titles[docname]),
+            types=meta.get('types', 'tutorials'),
+            banner=resolve_banner(app, meta.get('banner', app.config.odoo_cover_default)),
+            children=None if toc is None else [(e[0], e[1]) for e in toc['entries']],
+        )
+
+def external_banner(app, ref):
+    """ Banner of an entry which is not a document of the project """
+    config = app.config
+    if ref in config.odoo_cover_external:
+        return resolve_banner(app, config.odoo_cover_external[ref])
+    return resolve_banner(app, config.odoo_cover_default_external)
+
+def resolve_banner(app, cover):
+    """ Path of the static banner ``cover``, using its ``.small`` variant
+    if there is one
+    """
+    if not cover:
+        return None
+    banner = '_static/' + cover
+    base, ext = os.path.splitext(banner)
+    small = "{}.small{}".format(base, ext)
+    if os.path.isfile(os.path.join(app.srcdir, url2pathname(small))):
+        return small
+    return banner
@@ -0,0 +1,102 @@
+"""
+Incremental compilation of the translation catalogs.
+
+Sphinx compiles the ``.po`` files of the build's language next to them
+whenever they are newer than their ``.mo``, which on a fresh checkout means
+all of them. Instead, the catalogs are compiled (in a process pool) into
+``odoo_catalog_cache`` only when the content of their ``.po`` changed, and
+the build reads them from there. The cache can be shared by the builds of
+all languages.
+"""
+import concurrent.futures
+import hashlib
+import json
+import os
+import time
+
+from babel.messages.mofile import write_mo
+from babel.messages.pofile import read_po
+from sphinx.util import logging
+from sphinx.util.i18n import CatalogRepository
+
+logger = logging.getLogger(__name__)
+
+def setup(app):
+    # directory of the compiled catalogs, defaults to locale in the doctree
+    # directory
+    app.add_config_value('odoo_catalog_cache', None, '')
+    app.connect('config-inited', compile_catalogs)
+
+def compile_catalogs(app, config):
+    if not config.language:
+        return
+    repo = CatalogRepository(app.srcdir, config.locale_dirs, config.language, config.source_encoding)
+    catalogs = list(repo.catalogs)
+    if not catalogs:
+        return
+
+    cache = os.path.abspath(config.odoo_catalog_cache or os.path.join(app.doctreedir, 'locale'))
+    basedir = os.path.join(cache, config.language, 'LC_MESSAGES')
+    manifest_path = os.path.join(cache, config.language, 'catalogs.json')
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except (IOError, ValueError):
+        manifest = {}
+
+    jobs = {}
+    for catalog in catalogs:
+        with open(catalog.po_path, 'rb') as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        po_path = os.path.join(basedir, catalog.po_file)
+        mo_path = os.path.join(basedir, catalog.mo_file)
+        os.makedirs(os.path.dirname(po_path), exist_ok=True)
+        # the environment finds the catalogs (and makes the documents
+        # depend on their .mo) through their .po
+        if os.path.realpath(po_path) != os.path.realpath(catalog.po_path):
+            if os.path.lexists(po_path):
+                os.unlink(po_path)
+            os.symlink(os.path.abspath(catalog.po_path), po_path)
+        if manifest.get(catalog.domain) != digest or not os.path.isfile(mo_path):
+            jobs[catalog.domain] = (catalog.po_path, mo_path, config.language, catalog.charset, digest)
+
+    if jobs:
+        start = time.time()
+        with concurrent.futures.ProcessPoolExecutor(app.parallel if app.parallel > 1 else None) as pool:
+            for domain, (duration, error) in zip(jobs, pool.map(_compile, jobs.values())):
+                if error:
+                    logger.warning("could not compile catalog %s: %s", domain, error)
+                    manifest.pop(domain, None)
+                    continue
+                logger.info("compiled catalog %s in %.3fs", domain, duration)
+                manifest[domain] = jobs[domain][-1]
+        logger.info(
+            "compiled %d of %d catalogs in %.2fs",
+            len(jobs), len(catalogs), time.time() - start)
+        tmp = '%s.%d.tmp' % (manifest_path, os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f, indent=0, sort_keys=True)
+        os.replace(tmp, manifest_path)
+
+    config.locale_dirs = [cache]
+    # the catalogs are compiled above, Sphinx would recompile them whenever
+    # the .po is newer than the .mo (e.g. on a fresh checkout)
+    config.gettext_auto_build = False
+
+def _compile(job):
+    """ Compiles a .po into a .mo, runs in a worker process
+
+    :returns: ``(duration, error)``
+    """
+    po_path, mo_path, language, charset, _ = job
+    start = time.time()
+    try:
+        with open(po_path, encoding=charset) as f:
+            catalog = read_po(f, language)
+        tmp = '%s.%d.tmp' % (mo_path, os.getpid())
+        with open(tmp, 'wb') as f:
+            write_mo(f, catalog)
+        os.replace(tmp, mo_path)
+    except Exception as e:
+        return time.time() - start, str(e)
+    return time.time() - start, None
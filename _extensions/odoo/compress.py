@@ -0,0 +1,151 @@
+"""
+Precompression of the build output.
+
+At the end of the build, the compressible files of the output get ``.gz``
+(and ``.br`` when brotli is installed) siblings, which web servers can send as
+they are (e.g. nginx's ``gzip_static`` and ``brotli_static``) instead of
+compressing every response. The files are compressed in a process pool, and
+only when their content changed since the previous build.
+"""
+import collections
+import concurrent.futures
+import gzip
+import hashlib
+import io
+import json
+import os
+
+from sphinx.util import logging
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# extensions of the files worth compressing
+TYPES = ('.html', '.css', '.js', '.svg', '.json', '.txt', '.xml', '.map', '.ttf', '.eot')
+# smaller files don't get any smaller
+MIN_SIZE = 256
+
+def setup(app):
+    # whether to write compressed siblings of the output files
+    app.add_config_value('odoo_precompress', True, '')
+    try:
+        # after the other stages writing to the output (e.g. the purge of the
+        # stylesheet re-linking the pages)
+        app.connect('build-finished', compress_output, priority=900)
+    except TypeError:  # Sphinx < 3.0
+        app.connect('build-finished', compress_output)
+
+def compress_output(app, exception):
+    if exception or not app.config.odoo_precompress or app.builder.format != 'html':
+        return
+
+    outdir = app.builder.outdir
+    cache_path = os.path.join(app.doctreedir, 'compressed.json')
+    suffixes = ['.gz', '.br'] if brotli else ['.gz']
+    try:
+        with open(cache_path) as f:
+            cache = json.load(f)
+    except (IOError, ValueError):
+        cache = {}
+    previous = cache.get('files', {})
+    # everything is compressed again when brotli is installed or removed
+    usable = cache.get('suffixes') == suffixes
+
+    # relative path: [mtime, size, digest, original size, {suffix: compressed size}]
+    files = {}
+    jobs = {}
+    for root, _, names in os.walk(outdir):
+        for name in names:
+            if not name.endswith(TYPES):
+                continue
+            path = os.path.join(root, name)
+            rel = os.path.relpath(path, outdir)
+            stat = os.stat(path)
+            if stat.st_size < MIN_SIZE:
+                continue
+            entry = previous.get(rel) if usable else None
+            if entry and not all(os.path.isfile(path + suffix) for suffix in entry[4]):
+                entry = None
+            if entry and entry[:2] == [stat.st_mtime, stat.st_size]:
+                files[rel] = entry
+                continue
+            with open(path, 'rb') as f:
+                digest = hashlib.sha1(f.read()).hexdigest()
+            if entry and entry[2] == digest:
+                files[rel] = [stat.st_mtime, stat.st_size] + entry[2:]
+                continue
+            files[rel] = [stat.st_mtime, stat.st_size, digest, stat.st_size, {}]
+            jobs[rel] = path
+
+    # siblings of the files which are gone, or of a compression not available
+    # anymore
+    for rel, entry in previous.items():
+        for suffix in entry[4]:
+            path = os.path.join(outdir, rel + suffix)
+            if (rel not in files or suffix not in suffixes) and os.path.isfile(path):
+                os.unlink(path)
+
+    if jobs:
+        with concurrent.futures.ProcessPoolExecutor(app.parallel if app.parallel > 1 else None) as pool:
+            for rel, sizes in zip(jobs, pool.map(_compress, jobs.values(), chunksize=16)):
+                files[rel][4] = sizes
+    logger.info("compressed %d of %d files", len(jobs), len(files))
+
+    totals = collections.defaultdict(collections.Counter)
+    for rel, (_, _, _, size, sizes) in files.items():
+        counter = totals[os.path.splitext(rel)[1]]
+        counter['files'] += 1
+        counter['size'] += size
+        for suffix in suffixes:
+            # files which don't get smaller are served as they are
+            counter[suffix] += sizes.get(suffix, size)
+    for ext, counter in sorted(totals.items(), key=lambda item: -item[1]['size']):
+        saved = ', '.join(
+            '%.1fkB (%d%%) with %s' % (
+                (counter['size'] - counter[suffix]) / 1024,
+                100 * (counter['size'] - counter[suffix]) // counter['size'],
+                suffix[1:])
+            for suffix in suffixes
+        )
+        logger.info(
+            "%-5s %5d files, %8.1fkB, saved %s",
+            ext, counter['files'], counter['size'] / 1024, saved)
+
+    tmp = '%s.%d.tmp' % (cache_path, os.getpid())
+    with open(tmp, 'w') as f:
+        json.dump({'suffixes': suffixes, 'files': files}, f)
+    os.replace(tmp, cache_path)
+
+def _compress(path):
+    """ Writes the compressed siblings of ``path`` which are smaller than it,
+    runs in a worker process
+
+    :returns: ``{suffix: size}`` of the siblings written
+    """
+    with open(path, 'rb') as f:
+        content = f.read()
+    compressed = {}
+    buf = io.BytesIO()
+    # no timestamp, so an unchanged file compresses to the same bytes
+    with gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=9, mtime=0) as f:
+        f.write(content)
+    compressed['.gz'] = buf.getvalue()
+    if brotli:
+        compressed['.br'] = brotli.compress(content)
+
+    sizes = {}
+    for suffix, data in compressed.items():
+        if len(data) >= len(content):
+            if os.path.isfile(path + suffix):
+                os.unlink(path + suffix)
+            continue
+        tmp = '%s%s.%d.tmp' % (path, suffix, os.getpid())
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path + suffix)
+        sizes[suffix] = len(data)
+    return sizes
@@ -0,0 +1,126 @@
+"""
+Incremental extraction of the message templates.
+
+The ``gettext`` builder extracts the messages of every document on each
+build, even when the environment is kept. The ``gettext_sections`` builder
+only extracts the sections (text domains, i.e. ``locale/sources/*.pot``)
+with documents added, changed or removed since the previous build, one
+section per process with ``-j``.
+"""
+import collections
+import configparser
+import os
+
+from sphinx.builders.gettext import Catalog, MessageCatalogBuilder
+from sphinx.util import logging
+from sphinx.util.i18n import docname_to_domain
+from sphinx.util.parallel import ParallelTasks
+
+logger = logging.getLogger(__name__)
+
+def setup(app):
+    app.add_builder(SectionCatalogBuilder)
+    app.connect('env-get-outdated', record_removed)
+
+class SectionCatalogBuilder(MessageCatalogBuilder):
+    """ Message catalogs builder which only extracts the sections whose
+    documents changed since the previous build
+
+    A section is always extracted as a whole and in the order of its
+    documents, so its .pot is the same as a full extraction's.
+    """
+    name = 'gettext_sections'
+    allow_parallel = True
+
+    def init(self):
+        super().init()
+        # sections of the documents removed since the previous build
+        self.removed_sections = set()
+
+    def section(self, docname):
+        return docname_to_domain(docname, self.config.gettext_compact)
+
+    def get_outdated_docs(self):
+        # the sections of the updated documents are added in write(), only
+        # the sections whose .pot is missing need to be extracted here
+        return {
+            docname for docname in self.env.found_docs
+            if not os.path.isfile(os.path.join(self.outdir, self.section(docname) + '.pot'))
+        }
+
+    def write(self, build_docnames, updated_docnames, method='update'):
+        if build_docnames is None or build_docnames == ['__all__']:
+            build_docnames = self.env.found_docs
+        sections = {self.section(docname) for docname in build_docnames}
+        sections.update(self.section(docname) for docname in updated_docnames)
+        sections.update(self.removed_sections)
+
+        docnames = collections.defaultdict(list)
+        for docname in sorted(self.env.found_docs):
+            section = self.section(docname)
+            if section in sections:
+                docnames[section].append(docname)
+        logger.info(
+            "extracting messages of %d sections (%d documents)",
+            len(docnames), sum(map(len, docnames.values())))
+
+        if not (self.parallel_ok and len(docnames) > 1):
+            for names in docnames.values():
+                for docname in names:
+                    self.write_doc(docname, self.env.get_and_resolve_doctree(docname, self))
+            return
+
+        def merge(_, result):
+            section, catalog = result
+            self.catalogs[section] = catalog
+        tasks = ParallelTasks(self.app.parallel)
+        # largest sections first, so they don't end up alone at the end
+        for names in sorted(docnames.values(), key=len, reverse=True):
+            tasks.add_task(self._extract_section, names, merge)
+        tasks.join()
+
+    def _extract_section(self, docnames):
+        """ Extracts the messages of a section's documents, runs in a forked
+        worker process
+
+        :returns: ``(section, catalog)``
+        """
+        self.catalogs = collections.defaultdict(Catalog)
+        for docname in docnames:
+            self.write_doc(docname, self.env.get_and_resolve_doctree(docname, self))
+        return self.section(docnames[0]), self.catalogs[self.section(docnames[0])]
+
+    def finish(self):
+        super().finish()
+        for section in sorted(self.removed_sections - set(self.catalogs)):
+            path = os.path.join(self.outdir, section + '.pot')
+            if os.path.isfile(path):
+                logger.info("section %s has no documents anymore, removing %s", section, path)
+                os.unlink(path)
+
+        resources = transifex_resources(self.srcdir)
+        if resources is None:
+            return
+        for section in sorted(self.catalogs):
+            if section + '.pot' not in resources:
+                logger.warning("section %s has no resource in .tx/config", section)
+
+def record_removed(app, env, added, changed, removed):
+    if isinstance(app.builder, SectionCatalogBuilder):
+        app.builder.removed_sections.update(map(app.builder.section, removed))
+    return []
+
+def transifex_resources(srcdir):
+    """ Returns the names of the source files of the Transifex resources,
+    or ``None`` if the project has no .tx/config
+    """
+    path = os.path.join(srcdir, '.tx', 'config')
+    if not os.path.isfile(path):
+        return None
+    config = configparser.ConfigParser(interpolation=None)
+    config.read(path)
+    return {
+        os.path.basename(config[section]['source_file'])
+        for section in config.sections()
+        if 'source_file' in config[section]
+    }
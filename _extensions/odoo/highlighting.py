@@ -0,0 +1,191 @@
+"""
+Persistent cache of highlighted code blocks.
+
+Code blocks are the same in every language of the documentation, and rarely
+change between builds, so the Pygments output is stored in a SQLite
+database keyed by everything it depends on. Set ``odoo_highlight_cache`` to
+the same file for all languages to share it between ``i18nhtml`` builds.
+"""
+import contextlib
+import hashlib
+import json
+import logging as stdlogging
+import os
+import sqlite3
+import threading
+import time
+
+import pygments
+import sphinx
+from sphinx.util import logging
+
+logger = logging.getLogger(__name__)
+
+def setup(app):
+    # path of the cache database, defaults to highlight.db in the doctree
+    # directory
+    app.add_config_value('odoo_highlight_cache', None, '')
+    # maximum number of highlighted blocks kept in the cache
+    app.add_config_value('odoo_highlight_cache_size', 20000, '')
+    app.connect('builder-inited', open_cache)
+    app.connect('build-finished', close_cache)
+
+# bumped when the cached blocks change, e.g. blocks which could not be lexed
+# are not cached anymore
+CACHE_VERSION = 2
+
+cache = None
+def open_cache(app):
+    global cache
+    if not hasattr(app.builder, 'highlighter'):
+        return
+    path = app.config.odoo_highlight_cache or os.path.join(app.doctreedir, 'highlight.db')
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    style = app.builder.highlighter.formatter_args.get('style')
+    cache = HighlightCache(path, app.config.odoo_highlight_cache_size, style)
+
+def close_cache(app, exception):
+    global cache
+    if cache is None:
+        return
+    hits, misses = cache.hits, cache.misses
+    cache.close()
+    cache = None
+    if hits or misses:
+        logger.info(
+            "highlight cache: %d hits, %d misses (%.0f%% hit rate)",
+            hits, misses, 100. * hits / (hits + misses))
+
+def highlight_block(builder, source, lang, opts, linenos, highlight_args, warn):
+    """ Highlights ``source`` through the builder's highlighter, or gets it
+    from the cache if it was already highlighted with the same parameters
+    """
+    if cache is None:
+        return builder.highlighter.highlight_block(
+            source, lang, opts=opts, warn=warn, linenos=linenos,
+            **highlight_args)
+
+    key = cache.key(source, lang, opts, linenos, highlight_args)
+    highlighted = cache.get(key)
+    if highlighted is None:
+        warnings = []
+        def record(msg):
+            warnings.append(msg)
+            warn(msg)
+        with _record_warnings(warnings):
+            highlighted = builder.highlighter.highlight_block(
+                source, lang, opts=opts, warn=record, linenos=linenos,
+                **highlight_args)
+        # blocks which could not be lexed are not cached, so the warning is
+        # emitted by every build until the block is fixed
+        if not warnings:
+            cache.set(key, highlighted)
+    return highlighted
+
+class _WarningsHandler(stdlogging.Handler):
+    def __init__(self, warnings):
+        super(_WarningsHandler, self).__init__(stdlogging.WARNING)
+        self.warnings = warnings
+
+    def emit(self, record):
+        self.warnings.append(record.getMessage())
+
+@contextlib.contextmanager
+def _record_warnings(warnings):
+    """ Appends the warnings the highlighter logs (rather than passes to
+    ``warn``, Sphinx >= 1.6) to ``warnings``, they are still emitted
+    """
+    handler = _WarningsHandler(warnings)
+    highlighter_logger = logging.getLogger('sphinx.highlighting').logger
+    highlighter_logger.addHandler(handler)
+    try:
+        yield
+    finally:
+        highlighter_logger.removeHandler(handler)
+
+class HighlightCache(object):
+    """Highlighted blocks, keyed by a digest of the source, lexer, options,
+    Pygments and Sphinx versions and highlighting style. Only the ``size``
+    most recently used blocks are kept when the cache is closed.
+    """
+    def __init__(self, path, size, style=None):
+        self.path = path
+        self.size = size
+        self.salt = json.dumps([
+            CACHE_VERSION, pygments.__version__, sphinx.__version__, _style_digest(style),
+        ])
+        self.hits = self.misses = 0
+        # recently used keys, their timestamp is only updated when closing
+        self.used = set()
+        self.lock = threading.Lock()
+        self.owner = os.getpid()
+        self.pid = None
+        self.db = None
+
+    def connection(self):
+        # sqlite connections can't be shared with forked processes
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS blocks ("
+                " key TEXT PRIMARY KEY,"
+                " used REAL NOT NULL,"
+                " value TEXT NOT NULL)")
+        return self.db
+
+    def key(self, source, lang, opts, linenos, highlight_args):
+        return hashlib.sha1(json.dumps(
+            [self.salt, source, lang, opts, linenos, highlight_args],
+            sort_keys=True, default=repr,
+        ).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            row = self.connection().execute(
+                "SELECT value FROM blocks WHERE key = ?", [key]).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if self.pid == self.owner:
+                self.used.add(key)
+            else:
+                # the writers of a parallel build don't close the cache
+                with self.db:
+                    self.db.execute(
+                        "UPDATE blocks SET used = ? WHERE key = ?",
+                        [time.time(), key])
+            return row[0]
+
+    def set(self, key, value):
+        with self.lock, self.connection() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO blocks (key, used, value) VALUES (?, ?, ?)",
+                [key, time.time(), value])
+
+    def close(self):
+        if self.db is None:
+            return
+        with self.lock, self.connection() as db:
+            now = time.time()
+            db.executemany(
+                "UPDATE blocks SET used = ? WHERE key = ?",
+                ((now, key) for key in self.used))
+            db.execute(
+                "DELETE FROM blocks WHERE key NOT IN ("
+                " SELECT key FROM blocks ORDER BY used DESC LIMIT ?)",
+                [self.size])
+        self.db.close()
+        self.db = None
+
+def _style_digest(style):
+    if style is None:
+        return None
+    if isinstance(style, str):
+        return style
+    return hashlib.sha1(repr([
+        style.__module__, style.__name__,
+        style.background_color, style.highlight_color,
+        sorted((str(token), value) for token, value in style.styles.items()),
+    ]).encode('utf-8')).hexdigest()
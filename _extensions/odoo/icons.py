@@ -0,0 +1,98 @@
+"""
+Subsetting of the Material Design Icons font.
+
+The theme ships the whole icon font while the pages only use a few dozen
+icons. Once the stylesheet is purged (see :mod:`.purge`), the glyphs of its
+remaining ``content`` (the ``mdi-*`` icons used by the pages, ``layout.html``
+and ``doc.js``, and those of the theme's own rules) are extracted into a
+subset of the font, cached by the set of glyphs, and the stylesheet's
+``@font-face`` is pointed to it.
+
+Requires fontTools, and brotli for the woff2 version.
+"""
+import hashlib
+import os
+import re
+import shutil
+
+from sphinx.util import logging
+
+try:
+    from fontTools import subset
+    from fontTools.ttLib import TTFont
+except ImportError:
+    subset = TTFont = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+FONT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'fonts', 'Material-Design-Icons.ttf')
+FONT_FACE = re.compile(r'''@font-face\s*\{[^}]*font-family:\s*['"]?Material-Design-Icons['"]?[^}]*\}''')
+CONTENT = re.compile(r'''content:\s*(["'])((?:\\.|(?!\1).)*)\1''')
+ESCAPE = re.compile(r'\\([0-9a-fA-F]{1,6})\s?')
+# subsets of the font, and their compressed versions
+SUBSET = re.compile(r'Material-Design-Icons\.([0-9a-f]{10})\.')
+
+def subset_font(app, css):
+    """ Writes the subset of the icon font with the glyphs used by ``css``
+    to ``_static/fonts``, and returns ``css`` with its ``@font-face`` using
+    them instead of the full font
+    """
+    if subset is None or not FONT_FACE.search(css):
+        return css
+
+    with open(FONT, 'rb') as f:
+        font_digest = hashlib.sha1(f.read()).hexdigest()
+    cmap = set(TTFont(FONT).getBestCmap())
+    codepoints = set()
+    for _, content in CONTENT.findall(css):
+        codepoints.update(int(code, 16) for code in ESCAPE.findall(content))
+        codepoints.update(ord(c) for c in ESCAPE.sub('', content))
+    glyphs = sorted(codepoints & cmap)
+
+    key = hashlib.sha1(('%s %s' % (font_digest, glyphs)).encode('ascii')).hexdigest()[:10]
+    cache = os.path.join(app.doctreedir, 'assets', 'icons')
+    os.makedirs(cache, exist_ok=True)
+    flavors = [('woff2', 'woff2')] if brotli else []
+    flavors += [('woff', 'woff'), (None, 'truetype')]
+
+    sources = []
+    for flavor, fmt in flavors:
+        filename = 'Material-Design-Icons.%s.%s' % (key, flavor or 'ttf')
+        cached = os.path.join(cache, filename)
+        if not os.path.isfile(cached):
+            options = subset.Options()
+            options.flavor = flavor
+            options.notdef_outline = True
+            font = subset.load_font(FONT, options)
+            subsetter = subset.Subsetter(options)
+            subsetter.populate(unicodes=glyphs)
+            subsetter.subset(font)
+            tmp = '%s.%d.tmp' % (cached, os.getpid())
+            subset.save_font(font, tmp, options)
+            os.replace(tmp, cached)
+            logger.info(
+                "subset icon font to %d of %d glyphs: %.1fkB -> %.1fkB (%s)",
+                len(glyphs), len(cmap), os.path.getsize(FONT) / 1024,
+                os.path.getsize(cached) / 1024, flavor or 'ttf')
+        target = os.path.join(app.builder.outdir, '_static', 'fonts', filename)
+        if not os.path.isfile(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(cached, target)
+        sources.append("url('fonts/%s') format('%s')" % (filename, fmt))
+
+    # remove the subsets of the previous builds, from the output and the cache
+    fonts = os.path.join(app.builder.outdir, '_static', 'fonts')
+    for directory in (fonts, cache):
+        for name in os.listdir(directory):
+            match = SUBSET.match(name)
+            if match and match.group(1) != key:
+                os.unlink(os.path.join(directory, name))
+
+    return FONT_FACE.sub(lambda _: (
+        "@font-face{font-family:'Material-Design-Icons';src:%s;"
+        "font-weight:normal;font-style:normal}" % ','.join(sources)
+    ), css, count=1)
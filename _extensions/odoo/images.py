@@ -0,0 +1,429 @@
+"""
+Responsive variants of the raster images of the documentation.
+
+Once the environment is up to date, narrower variants (and WebP versions)
+of all PNG and JPEG images are generated in a process pool. They are cached
+by content hash in the doctree directory and copied next to the original
+images at the end of the build. ``BootstrapTranslator.visit_image`` then
+lists them in the image's ``srcset``.
+
+Everything is cached in ``odoo_image_cache`` (the doctree directory by
+default), which all languages of the documentation can share.
+
+Generating the variants requires Pillow, images are left alone if it is not
+installed. The intrinsic size of images, which the translator sets on all
+``img``, is read from their headers and cached by path and mtime.
+
+The banners of toctree cards are likewise resized to the size of the cards
+(unless a ``.small`` variant was provided) and converted to WebP.
+"""
+import concurrent.futures
+import hashlib
+import json
+import os
+import posixpath
+import struct
+from urllib.request import url2pathname
+
+from docutils import nodes
+from sphinx.util import logging
+from sphinx.util.osutil import copyfile
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = ImageOps = None
+
+from . import cards
+
+logger = logging.getLogger(__name__)
+
+RASTER_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+def setup(app):
+    # directory of the generated images and cached image sizes, defaults to
+    # the doctree directory
+    app.add_config_value('odoo_image_cache', None, '')
+    # widths (in pixels) of the variants generated for each image, only
+    # those narrower than the image itself are generated
+    app.add_config_value('odoo_image_widths', [480, 960], 'html')
+    # also generate WebP versions of the images and their variants
+    app.add_config_value('odoo_image_webp', True, 'html')
+    # number of images at the top of each page loaded eagerly, the others
+    # are most likely below the fold and lazy loaded
+    app.add_config_value('odoo_eager_images', 1, 'html')
+    # size (in pixels) of the generated banners of toctree cards, large
+    # enough for the widest card on high density screens
+    app.add_config_value('odoo_card_banner_size', (600, 336), 'html')
+    app.connect('builder-inited', open_sizes)
+    app.connect('doctree-resolved', read_sizes)
+    app.connect('env-updated', generate_variants)
+    # after cards.update_cards
+    app.connect('env-updated', generate_banners)
+    app.connect('build-finished', copy_variants)
+    app.connect('build-finished', copy_banners)
+    app.connect('build-finished', close_sizes)
+
+def generate_variants(app, env):
+    app.builder.odoo_image_variants = {}
+    if Image is None or app.builder.format != 'html':
+        return
+    cache_dir = _cache_dir(app, 'images')
+    os.makedirs(cache_dir, exist_ok=True)
+    widths = sorted(app.config.odoo_image_widths)
+    webp = app.config.odoo_image_webp
+    # the settings are part of the cache key, so changing them regenerates
+    # the variants
+    salt = json.dumps([widths, webp]).encode('utf-8')
+
+    variants = app.builder.odoo_image_variants
+    jobs = {}
+    for src, (_, name) in env.images.items():
+        ext = os.path.splitext(src)[1].lower()
+        if ext not in RASTER_EXTENSIONS:
+            continue
+        path = os.path.join(app.srcdir, src)
+        digest = _digest(salt, path)
+        if digest is None:
+            continue
+        manifest = _read_json(os.path.join(cache_dir, digest + '.json'))
+        if manifest is not None:
+            variants[name] = dict(manifest, digest=digest)
+        else:
+            jobs[name] = (path, os.path.join(cache_dir, digest), ext, widths, webp)
+
+    if jobs:
+        logger.info("generating responsive variants of %d images", len(jobs))
+        with _pool(app) as pool:
+            for name, result in zip(jobs, pool.map(_make_variants, jobs.values(), chunksize=8)):
+                if result is not None:
+                    variants[name] = dict(result, digest=os.path.basename(jobs[name][1]))
+
+def generate_banners(app, env):
+    app.builder.odoo_banners = {}
+    if Image is None or app.builder.format != 'html':
+        return
+    config = app.config
+    banners = {card.banner for card in env.odoo_cards.values()}
+    banners.update(
+        cards.resolve_banner(app, cover)
+        for cover in list(config.odoo_cover_external.values()) + [config.odoo_cover_default_external]
+    )
+    banners.discard(None)
+
+    cache_dir = _cache_dir(app, 'banners')
+    os.makedirs(cache_dir, exist_ok=True)
+    size = list(config.odoo_card_banner_size)
+    salt = json.dumps([size, config.odoo_image_webp]).encode('utf-8')
+
+    jobs = {}
+    for banner in banners:
+        base, ext = posixpath.splitext(banner)
+        if ext.lower() not in RASTER_EXTENSIONS:
+            continue
+        path = os.path.join(app.srcdir, url2pathname(banner))
+        digest = _digest(salt, path)
+        if digest is None:
+            continue
+        manifest = _read_json(os.path.join(cache_dir, digest + '.json'))
+        if manifest is not None:
+            app.builder.odoo_banners[banner] = dict(manifest, digest=digest)
+        else:
+            # a hand-made small variant is only converted
+            resize = size if not base.endswith('.small') else None
+            jobs[banner] = (path, os.path.join(cache_dir, digest), ext.lower(), resize, config.odoo_image_webp)
+
+    if jobs:
+        logger.info("generating card banners for %d images", len(jobs))
+        with _pool(app) as pool:
+            for banner, result in zip(jobs, pool.map(_make_banner, jobs.values())):
+                if result is not None:
+                    app.builder.odoo_banners[banner] = dict(result, digest=os.path.basename(jobs[banner][1]))
+
+def _make_banner(job):
+    """ Generates the card-sized version of a banner and its WebP version in
+    the cache, runs in a worker process
+    """
+    path, prefix, ext, size, webp = job
+    try:
+        im = Image.open(path)
+        im.load()
+    except (IOError, ValueError):
+        return None
+    served = os.path.getsize(path)
+    palette = im.mode == 'P'
+    if im.mode not in ('RGB', 'RGBA', 'L'):
+        im = im.convert('RGBA' if ext == '.png' else 'RGB')
+
+    manifest = {'small': False, 'webp': False}
+    if size and im.size[0] > size[0]:
+        # cropped like the card's "background-size: cover"
+        small = ImageOps.fit(im, tuple(size), Image.LANCZOS)
+        (small.quantize(method=Image.FASTOCTREE) if palette else small).save(prefix + ext)
+        if os.path.getsize(prefix + ext) < served:
+            im = small
+            served = os.path.getsize(prefix + ext)
+            manifest['small'] = True
+        else:
+            os.unlink(prefix + ext)
+    if webp:
+        im.save(prefix + '.webp', quality=80)
+        if os.path.getsize(prefix + '.webp') < served:
+            manifest['webp'] = True
+        else:
+            os.unlink(prefix + '.webp')
+
+    _write_json(prefix + '.json', manifest)
+    return manifest
+
+def card_banner(builder, banner):
+    """ Returns the path of the banner to display on a card for ``banner``
+    and the path of its WebP version (``None`` if there is none)
+    """
+    manifest = getattr(builder, 'odoo_banners', {}).get(banner)
+    if manifest is None:
+        return banner, None
+    if manifest['small']:
+        base, ext = posixpath.splitext(banner)
+        banner = '%s.small%s' % (base, ext)
+    if manifest['webp']:
+        return banner, posixpath.splitext(banner)[0] + '.webp'
+    return banner, None
+
+def copy_banners(app, exception):
+    banners = getattr(app.builder, 'odoo_banners', None)
+    if exception or not banners:
+        return
+    cache_dir = _cache_dir(app, 'banners')
+    for banner, manifest in banners.items():
+        prefix = os.path.join(cache_dir, manifest['digest'])
+        small, webp = card_banner(app.builder, banner)
+        if manifest['small']:
+            copyfile(prefix + posixpath.splitext(banner)[1].lower(),
+                     os.path.join(app.builder.outdir, url2pathname(small)))
+        if webp:
+            copyfile(prefix + '.webp', os.path.join(app.builder.outdir, url2pathname(webp)))
+
+def _digest(salt, path):
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha1(salt + f.read()).hexdigest()
+    except IOError:
+        return None
+
+def _cache_dir(app, name):
+    return os.path.join(app.config.odoo_image_cache or app.doctreedir, name)
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return None
+
+def _write_json(path, data):
+    # builds of other languages may be reading the file concurrently
+    tmp = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+def _pool(app):
+    return concurrent.futures.ProcessPoolExecutor(app.parallel if app.parallel > 1 else None)
+
+def _make_variants(job):
+    """ Generates the variants of an image in the cache, runs in a worker
+    process
+
+    :returns: the manifest of the variants (the image's size and the widths
+              of its variants), ``None`` if the image can't be read
+    """
+    path, prefix, ext, widths, webp = job
+    try:
+        im = Image.open(path)
+        im.load()
+    except (IOError, ValueError):
+        return None
+    width, height = im.size
+    size = os.path.getsize(path)
+    # most screenshots are palette PNGs, resampling needs true colours but
+    # the variants are quantized back so they don't outweigh the original
+    palette = im.mode == 'P'
+    if im.mode not in ('RGB', 'RGBA', 'L'):
+        im = im.convert('RGBA' if ext == '.png' else 'RGB')
+
+    manifest = {'width': width, 'height': height, 'widths': [], 'webp': False}
+    resized = {width: im}
+    for w in widths:
+        if w >= width:
+            break
+        resized[w] = im.resize((w, max(1, round(height * w / width))), Image.LANCZOS)
+        variant = '%s-%d%s' % (prefix, w, ext)
+        (resized[w].quantize(method=Image.FASTOCTREE) if palette else resized[w]).save(variant)
+        # a variant heavier than the original is not worth serving
+        if os.path.getsize(variant) < size:
+            manifest['widths'].append(w)
+        else:
+            os.unlink(variant)
+    if webp:
+        full = '%s-%d.webp' % (prefix, width)
+        im.save(full, quality=80)
+        if os.path.getsize(full) < size:
+            manifest['webp'] = True
+            for w in manifest['widths']:
+                resized[w].save('%s-%d.webp' % (prefix, w), quality=80)
+        else:
+            os.unlink(full)
+
+    _write_json(prefix + '.json', manifest)
+    return manifest
+
+def variant_name(name, width, ext=None):
+    """ Name of the variant of the image ``name`` at ``width``, in the
+    output's image directory
+    """
+    base, orig_ext = os.path.splitext(name)
+    return '%s-%dw%s' % (base, width, ext or orig_ext)
+
+def srcsets(imgpath, name, variants):
+    """ Returns the ``srcset`` of the image ``name``, of its WebP versions
+    (``None`` if there are none) and the matching ``sizes``
+    """
+    width = variants['width']
+    candidates = [
+        (posixpath.join(imgpath, variant_name(name, w)), w)
+        for w in variants['widths']
+    ] + [(posixpath.join(imgpath, name), width)]
+    srcset = ', '.join('%s %dw' % c for c in candidates)
+
+    webp_srcset = None
+    if variants['webp']:
+        webp_srcset = ', '.join(
+            '%s %dw' % (posixpath.join(imgpath, variant_name(name, w, '.webp')), w)
+            for w in variants['widths'] + [width]
+        )
+    return srcset, webp_srcset, '(max-width: {0}px) 100vw, {0}px'.format(width)
+
+def copy_variants(app, exception):
+    variants = getattr(app.builder, 'odoo_image_variants', None)
+    if exception or not variants:
+        return
+    cache_dir = _cache_dir(app, 'images')
+    outdir = os.path.join(app.builder.outdir, app.builder.imagedir)
+    used = set(app.builder.images.values())
+    for name, manifest in variants.items():
+        # images of documents which were not written in this build were
+        # copied by a previous one
+        if name not in used:
+            continue
+        prefix = os.path.join(cache_dir, manifest['digest'])
+        ext = os.path.splitext(name)[1].lower()
+        for w in manifest['widths']:
+            copyfile('%s-%d%s' % (prefix, w, ext), os.path.join(outdir, variant_name(name, w)))
+        if manifest['webp']:
+            for w in manifest['widths'] + [manifest['width']]:
+                copyfile('%s-%d.webp' % (prefix, w), os.path.join(outdir, variant_name(name, w, '.webp')))
+
+sizes = None
+def open_sizes(app):
+    global sizes
+    os.makedirs(_cache_dir(app, ''), exist_ok=True)
+    sizes = ImageSizes(_cache_dir(app, 'image_sizes.json'))
+
+def close_sizes(app, exception):
+    global sizes
+    if sizes is None:
+        return
+    if sizes.annotated or sizes.unknown:
+        logger.info(
+            "image dimensions: %d images annotated, %d unknown",
+            sizes.annotated, sizes.unknown)
+    sizes.close()
+    sizes = None
+
+def read_sizes(app, doctree, docname):
+    """ Reads the sizes of the images of the document before it is written,
+    in the main process so the writers of a parallel build find them in the
+    cache
+    """
+    if sizes is None:
+        return
+    for node in doctree.traverse(nodes.image):
+        if node['uri'] not in app.env.images:
+            continue
+        if sizes.get(os.path.join(app.srcdir, node['uri'])) is None:
+            sizes.unknown += 1
+        else:
+            sizes.annotated += 1
+
+def image_size(path):
+    """ Intrinsic ``(width, height)`` of the image at ``path``, ``None`` if
+    it is not known
+    """
+    if sizes is None:
+        return None
+    return sizes.get(path)
+
+class ImageSizes(object):
+    """Sizes of the images read from their headers, persisted in ``path``
+    and keyed by image path and mtime.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.annotated = self.unknown = 0
+        self.dirty = False
+        self.sizes = _read_json(path) or {}
+
+    def get(self, path):
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return None
+        cached = self.sizes.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1] and tuple(cached[1])
+
+        try:
+            with open(path, 'rb') as f:
+                size = read_size(f)
+        except (IOError, struct.error):
+            size = None
+        self.sizes[path] = [mtime, size]
+        self.dirty = True
+        return size
+
+    def close(self):
+        if not self.dirty:
+            return
+        _write_json(self.path, self.sizes)
+
+# JPEG start of frame markers, which hold the image's dimensions
+SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+def read_size(f):
+    """ Reads the dimensions of a PNG, GIF or JPEG image from the header of
+    the file ``f``
+
+    :returns: ``(width, height)``, ``None`` for other formats
+    """
+    head = f.read(26)
+    if head.startswith(b'\x89PNG\r\n\x1a\n') and head[12:16] == b'IHDR':
+        return struct.unpack('>II', head[16:24])
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return struct.unpack('<HH', head[6:10])
+    if head.startswith(b'\xff\xd8'):
+        # walk the segments up to the first start of frame
+        f.seek(2)
+        while True:
+            marker = f.read(2)
+            while marker[1:] == b'\xff':
+                # fill bytes
+                marker = marker[1:] + f.read(1)
+            if len(marker) < 2 or marker[0] != 0xFF:
+                return None
+            if marker[1] in SOF_MARKERS:
+                height, width = struct.unpack('>3xHH', f.read(7))
+                return width, height
+            length, = struct.unpack('>H', f.read(2))
+            f.seek(length - 2, os.SEEK_CUR)
+    return None
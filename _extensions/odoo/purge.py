@@ -0,0 +1,228 @@
+"""
+Removal of the unused rules of the theme's stylesheet.
+
+``style.css`` embeds the whole of Bootstrap while the pages only use a part
+of it. After the build, the classes and ids of the generated pages and the
+strings of the scripts (which add classes dynamically) are collected, and the
+rules whose selectors use none of them are removed from the fingerprinted
+stylesheet (see :mod:`.assets`), and its icon font is subset (see
+:mod:`.icons`). The pages are then linked to the purged stylesheet.
+
+The tokens of the pages and scripts are cached by modification time, so only
+the files written by the build are scanned, and the purged stylesheet is
+cached by the tokens it was purged with.
+"""
+import fnmatch
+import hashlib
+import json
+import os
+import re
+
+from sphinx.util import logging
+
+from . import assets
+from . import icons
+
+logger = logging.getLogger(__name__)
+
+ATTRIBUTES = re.compile(r'''\b(?:class|id)\s*=\s*(["'])(.*?)\1''', re.S)
+STRINGS = re.compile(r'''"((?:\\.|[^"\\\n])*)"|'((?:\\.|[^'\\\n])*)\'''')
+TOKEN = re.compile(r'-?[_a-zA-Z][\w-]*')
+COMMENTS = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')|/\*(?!!).*?\*/''', re.S)
+SELECTOR_TOKENS = re.compile(r'[.#](-?[_a-zA-Z][\w-]*)')
+STYLESHEET = re.compile(r'_static/style\.[0-9a-f]{10}\.css')
+STYLESHEET_FILE = re.compile(r'style\.[0-9a-f]{10}\.css$')
+# cached purged stylesheets
+PURGED = re.compile(r'style\.purged\.([0-9a-f]{40})\.css$')
+# directories of the output without pages or scripts
+SKIP = {'_images', '_sources', '_downloads'}
+
+def setup(app):
+    # glob patterns of classes and ids whose rules are always kept
+    app.add_config_value('odoo_css_allowlist', [], 'html')
+    app.connect('build-finished', purge_stylesheet)
+
+def purge_stylesheet(app, exception):
+    if exception or '_static/style.css' not in assets.manifest:
+        return
+
+    outdir = app.builder.outdir
+    cache_path = os.path.join(app.doctreedir, 'assets', 'purge.json')
+    try:
+        with open(cache_path) as f:
+            cache = json.load(f)
+    except (IOError, ValueError):
+        cache = {'stylesheet': None, 'files': {}}
+
+    # relative path: [mtime, size, tokens]
+    files = {}
+    written = []
+    for root, dirs, names in os.walk(outdir):
+        dirs[:] = [d for d in dirs if d not in SKIP]
+        for name in names:
+            # the strings of the search index are the words of the documents
+            if not name.endswith(('.html', '.js')) or name == 'searchindex.js':
+                continue
+            path = os.path.join(root, name)
+            rel = os.path.relpath(path, outdir)
+            stat = os.stat(path)
+            entry = cache['files'].get(rel)
+            if entry and entry[:2] == [stat.st_mtime, stat.st_size]:
+                files[rel] = entry
+                continue
+            with open(path, encoding='utf-8', errors='replace') as f:
+                content = f.read()
+            if name.endswith('.html'):
+                tokens = {t for _, value in ATTRIBUTES.findall(content) for t in value.split()}
+                written.append(rel)
+            else:
+                tokens = {t for match in STRINGS.findall(content) for t in TOKEN.findall(''.join(match))}
+            files[rel] = [stat.st_mtime, stat.st_size, sorted(tokens)]
+
+    used = set()
+    for _, _, tokens in files.values():
+        used.update(tokens)
+    allowlist = sorted(app.config.odoo_css_allowlist)
+
+    source = os.path.join(outdir, assets.manifest['_static/style.css'])
+    with open(source, encoding='utf-8') as f:
+        css = f.read()
+    key = hashlib.sha1('\n'.join([css] + allowlist + sorted(used)).encode('utf-8')).hexdigest()
+    cached = os.path.join(app.doctreedir, 'assets', 'style.purged.%s.css' % key)
+    if os.path.isfile(cached):
+        with open(cached, encoding='utf-8') as f:
+            purged = f.read()
+    else:
+        allowed = re.compile('|'.join(fnmatch.translate(p) for p in allowlist) or '(?!)')
+        counts = [0, 0]
+        def keep(selector):
+            counts[0] += 1
+            # escaped characters are not supported by SELECTOR_TOKENS
+            if '\\' in selector:
+                counts[1] += 1
+                return True
+            selector = re.sub(r'\[[^\]]*\]|:not\([^)]*\)', '', selector)
+            for token in SELECTOR_TOKENS.findall(selector):
+                if token not in used and not allowed.match(token):
+                    return False
+            counts[1] += 1
+            return True
+        purged = _purge(COMMENTS.sub(lambda m: m.group(1) or '', css), keep)
+        tmp = '%s.%d.tmp' % (cached, os.getpid())
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(purged)
+        os.replace(tmp, cached)
+        logger.info("kept %d of %d selectors of style.css", counts[1], counts[0])
+    # only keep the stylesheet purged with the current tokens in the cache
+    for name in os.listdir(os.path.dirname(cached)):
+        match = PURGED.match(name)
+        if match and match.group(1) != key:
+            os.unlink(os.path.join(os.path.dirname(cached), name))
+
+    purged = icons.subset_font(app, purged)
+
+    filename = 'style.%s.css' % hashlib.sha1(purged.encode('utf-8')).hexdigest()[:10]
+    target = os.path.join(outdir, '_static', filename)
+    if not os.path.isfile(target):
+        with open(target, 'w', encoding='utf-8') as f:
+            f.write(purged)
+    logger.info(
+        "purged style.css: %.1fkB -> %.1fkB",
+        len(css.encode('utf-8')) / 1024, len(purged.encode('utf-8')) / 1024)
+
+    # pages written by this build link to the unpurged stylesheet, the others
+    # to the one purged by the previous build
+    link = '_static/' + filename
+    rewrite = written if cache['stylesheet'] == filename else [rel for rel in files if rel.endswith('.html')]
+    for rel in rewrite:
+        path = os.path.join(outdir, rel)
+        with open(path, encoding='utf-8') as f:
+            content = f.read()
+        content, count = STYLESHEET.subn(link, content)
+        if not count:
+            continue
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        stat = os.stat(path)
+        files[rel][:2] = [stat.st_mtime, stat.st_size]
+
+    # the unpurged stylesheet, and the one purged by the previous build (see
+    # assets.build_assets), are not linked by any page anymore
+    static = os.path.join(outdir, '_static')
+    for name in os.listdir(static):
+        if STYLESHEET_FILE.match(name) and name != filename:
+            os.unlink(os.path.join(static, name))
+    assets.manifest['_static/style.css'] = link
+    assets.write_manifest(app)
+
+    tmp = '%s.%d.tmp' % (cache_path, os.getpid())
+    with open(tmp, 'w') as f:
+        json.dump({'stylesheet': filename, 'files': files}, f)
+    os.replace(tmp, cache_path)
+
+def _purge(css, keep):
+    """ Removes the rules of ``css`` whose selectors are all rejected by
+    ``keep``, recursing into conditional at-rules
+    """
+    out = []
+    pos = 0
+    while pos < len(css):
+        end = _find(css, pos, '{;}')
+        if end == -1 or css[end] != '{':
+            # trailing content, or an at-rule without block (@import, @charset)
+            end = len(css) if end == -1 else end + 1
+            out.append(css[pos:end])
+            pos = end
+            continue
+        close = _find(css, end + 1, '}', nested=True)
+        if close == -1:
+            close = len(css)
+        prelude, body = css[pos:end], css[end + 1:close]
+        at_rule = prelude.strip()
+        if at_rule.startswith(('@media', '@supports', '@document')):
+            body = _purge(body, keep)
+            if body.strip():
+                out.append('%s{%s}' % (prelude, body))
+        elif at_rule.startswith('@'):
+            # @font-face, @keyframes, @page, ...
+            out.append('%s{%s}' % (prelude, body))
+        else:
+            selectors = []
+            start = 0
+            while True:
+                comma = _find(prelude, start, ',')
+                selector = prelude[start:] if comma == -1 else prelude[start:comma]
+                if keep(selector.strip()):
+                    selectors.append(selector)
+                if comma == -1:
+                    break
+                start = comma + 1
+            if selectors:
+                out.append('%s{%s}' % (','.join(selectors), body))
+        pos = close + 1
+    return ''.join(out)
+
+def _find(css, pos, chars, nested=False):
+    """ Returns the index of the first of ``chars`` from ``pos`` which is not
+    in a string or between parentheses (or in a block if ``nested``), or -1
+    """
+    depth = 0
+    quote = None
+    i = pos
+    while i < len(css):
+        c = css[i]
+        if quote:
+            if c == '\\':
+                i += 1
+            elif c == quote:
+                quote = None
+        elif c in '"\'':
+            quote = c
+        elif c == '(' or nested and c == '{':
+            depth += 1
+        elif depth and (c == ')' or nested and c == '}'):
+            depth -= 1
+        elif not depth and c in chars:
+            return i
+        i += 1
+    return -1
@@ -0,0 +1,67 @@
+"""
+Script bundles loaded by the pages which use them.
+
+A document lists the bundles (of ``odoo_script_bundles``) it needs in the
+``scripts`` field of its metadata, e.g. ``:scripts: accounting``, and only its
+page loads the scripts of these bundles, in order and once each.
+"""
+import os.path
+
+from sphinx.util import logging
+
+logger = logging.getLogger(__name__)
+
+def setup(app):
+    # bundle name: [script file in html_static_path]
+    app.add_config_value('odoo_script_bundles', {}, 'html')
+    app.connect('html-page-context', add_scripts)
+    app.connect('build-finished', report_bundles)
+
+def page_scripts(app, docname, meta):
+    """ Returns the static paths of the scripts of the bundles listed in the
+    metadata of ``docname``
+    """
+    scripts = []
+    for name in meta.get('scripts', '').split():
+        bundle = app.config.odoo_script_bundles.get(name)
+        if bundle is None:
+            logger.warning("unknown script bundle %r", name, location=docname)
+            continue
+        scripts.extend(s for s in bundle if s not in scripts)
+    return scripts
+
+def add_scripts(app, pagename, templatename, context, doctree):
+    meta = context.get('meta')
+    if not (meta and 'scripts' in meta):
+        return
+    # script_files is shared by all the pages, it must not be changed in place
+    context['script_files'] = list(context.get('script_files', [])) + [
+        '_static/' + script
+        for script in page_scripts(app, pagename, meta)
+    ]
+
+def report_bundles(app, exception):
+    if exception or app.builder.format != 'html' or not app.config.odoo_script_bundles:
+        return
+
+    pages = {name: [] for name in app.config.odoo_script_bundles}
+    for docname in sorted(app.env.found_docs):
+        for name in app.env.metadata[docname].get('scripts', '').split():
+            pages.get(name, []).append(docname)
+
+    for name, scripts in sorted(app.config.odoo_script_bundles.items()):
+        size = 0
+        for script in scripts:
+            path = next((
+                os.path.join(app.confdir, d, script)
+                for d in app.config.html_static_path
+                if os.path.isfile(os.path.join(app.confdir, d, script))
+            ), None)
+            if path is None:
+                logger.warning("script %s of bundle %r not found", script, name)
+                continue
+            size += os.path.getsize(path)
+        logger.info(
+            "script bundle %s (%d scripts, %.1fkB) loaded by %d pages%s",
+            name, len(scripts), size / 1024, len(pages[name]),
+            ''.join('\n    ' + docname for docname in pages[name]))
@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import functools
 import os.path
 import posixpath
 import re
@@ -7,13 +8,32 @@ from docutils import nodes
 from sphinx import addnodes, util, builders
 from sphinx.locale import admonitionlabels
 
-from urllib.request import url2pathname
-
-
-def _parents(node):
-    while node.parent:
-        node = node.parent
-        yield node
+from . import highlighting
+from . import images
+from .cards import external_banner
+
+
+ESCAPES = {
+    ord('&'): u'&amp;',
+    ord('<'): u'&lt;',
+    ord('"'): u'&quot;',
+    ord('>'): u'&gt;',
+    0xa0: u'&nbsp;'
+}
+# only "space characters" SPACE, CHARACTER TABULATION, LINE FEED,
+# FORM FEED and CARRIAGE RETURN should be collapsed, not al White_Space
+WHITESPACE = re.compile(u'[ \t\n\f\r]')
+
+@functools.lru_cache(maxsize=4096)
+def _attval(value):
+    # attribute values (classes, internal links, ...) repeat a lot, both
+    # within and across pages
+    return WHITESPACE.sub(u' ', value).translate(ESCAPES)
+
+# start tags of elements without attributes, by tag name. Shared on purpose by
+# all the translators (and documents) of the process, like the cache of
+# _attval: the tags only depend on the tag name
+BARE_STARTTAGS = {}
 
 class BootstrapTranslator(nodes.NodeVisitor, object):
     head_prefix = 'head_prefix'
@@ -56,6 +76,15 @@ class BootstrapTranslator(nodes.NodeVisitor, object):
 
         self.context = []
         self.section_level = 0
+        # ancestors tracked by the visit/depart methods, so nodes don't have
+        # to walk up the tree to find out where they are
+        self.admonition_level = 0
+        # stack of the enclosing tables' thead/tbody
+        self.table_sections = []
+        # {parent: the child which can be rendered as a compact paragraph}
+        self.compact_children = {}
+        # number of images already rendered in the document
+        self.image_count = 0
 
         self.config = builder.config
         self.highlightlang = self.highlightlang_base = self.builder.config.highlight_language
@@ -67,13 +96,7 @@ class BootstrapTranslator(nodes.NodeVisitor, object):
         self.param_separator = ','
 
     def encode(self, text):
-        return text.translate({
-            ord('&'): u'&amp;',
-            ord('<'): u'&lt;',
-            ord('"'): u'&quot;',
-            ord('>'): u'&gt;',
-            0xa0: u'&nbsp;'
-        })
+        return text.translate(ESCAPES)
 
     def add_meta(self, meta):
         self.meta.append('\n    ' + meta)
@@ -82,39 +105,45 @@ class BootstrapTranslator(nodes.NodeVisitor, object):
         tagname = tagname.lower()
 
         # extract generic attributes
-        attrs = {name.lower(): value for name, value in attributes.items()}
-        attrs.update(
-            (name, value) for name, value in node.attributes.items()
-            if name.startswith('data-')
-        )
-
-        prefix = []
-        postfix = []
+        attrs = {}
+        for name, value in attributes.items():
+            attrs[name.lower()] = value
+        for name, value in node.attributes.items():
+            if name.startswith('data-'):
+                attrs[name] = value
 
         # handle possibly multiple ids
         assert 'id' not in attrs, "starttag can't be passed a single id attribute, use a list of ids"
-        ids = node.get('ids', []) + attrs.pop('ids', [])
+        ids = node.get('ids', [])
+        if 'ids' in attrs:
+            ids = ids + attrs.pop('ids')
+        classes = node.get('classes', [])
+        if 'class' in attrs:
+            classes = classes + attrs.pop('class').split()
+
+        if not (attrs or ids or classes):
+            starttag = BARE_STARTTAGS.get(tagname)
+            if starttag is None:
+                starttag = BARE_STARTTAGS[tagname] = u'<{} >'.format(tagname)
+            return starttag
+
+        postfix = u''
         if ids:
-            _ids = iter(ids)
-            attrs['id'] = next(_ids)
-            postfix.extend(u'<i id="{}"></i>'.format(_id) for _id in _ids)
+            attrs['id'] = ids[0]
+            postfix = u''.join(u'<i id="{}"></i>'.format(_id) for _id in ids[1:])
 
-        # set CSS class
-        classes = set(node.get('classes', []) + attrs.pop('class', '').split())
+        # set CSS class, deduplicated but in a stable order
         if classes:
-            attrs['class'] = u' '.join(classes)
-
-        return u'{prefix}<{tag} {attrs}>{postfix}'.format(
-            prefix=u''.join(prefix),
-            tag=tagname,
-            attrs=u' '.join(u'{}="{}"'.format(name, self.attval(value))
-                            for name,  value in attrs.items()),
-            postfix=u''.join(postfix),
+            attrs['class'] = u' '.join(dict.fromkeys(classes))
+
+        return u'<{} {}>{}'.format(
+            tagname,
+            u' '.join([u'{}="{}"'.format(name, self.attval(value))
+                       for name, value in attrs.items()]),
+            postfix,
         )
-    # only "space characters" SPACE, CHARACTER TABULATION, LINE FEED,
-    # FORM FEED and CARRIAGE RETURN should be collapsed, not al White_Space
-    def attval(self, value, whitespace=re.compile(u'[ \t\n\f\r]')):
-        return self.encode(whitespace.sub(u' ', str(value)))
+    def attval(self, value):
+        return _attval(str(value))
 
     def astext(self):
         return u''.join(self.body)
@@ -170,19 +199,28 @@ class BootstrapTranslator(nodes.NodeVisitor, object):
             if key != 'classes' or value not in ([], ['first'], ['last'], ['first', 'last']):
                 return False
 
-        first = isinstance(node.parent[0], nodes.label)
-        for child in parent.children[first:]:
-            # only first paragraph can be compact
+        try:
+            compact = self.compact_children[parent]
+        except KeyError:
+            compact = self.compact_children[parent] = self.compact_child(parent)
+        return compact is node
+
+    def compact_child(self, parent):
+        """ Finds the child of ``parent`` which may be rendered as a compact
+        paragraph in a single pass over its children: the first visible child
+        (ignoring a leading label), if it is the only visible non-label
+        child.
+        """
+        candidate = None
+        length = 0
+        for index, child in enumerate(parent.children):
             if isinstance(child, nodes.Invisible):
                 continue
-            if child is node:
-                break
-            return False
-        parent_length = len([
-            1 for n in parent
-            if not isinstance(n, (nodes.Invisible, nodes.label))
-        ])
-        return parent_length == 1
+            if candidate is None and not (index == 0 and isinstance(child, nodes.label)):
+                candidate = child
+            if not isinstance(child, nodes.label):
+                length += 1
+        return candidate if length == 1 else None
 
     def visit_paragraph(self, node):
         if self.is_compact_paragraph(node):
@@ -217,9 +255,9 @@ class BootstrapTranslator(nodes.NodeVisitor, object):
 
         def warner(msg):
             self.builder.warn(msg, (self.builder.current_docname, node.line))
-        highlighted = self.builder.highlighter.highlight_block(
-            node.rawsource, lang, opts=opts, warn=warner, linenos=linenos,
-            **highlight_args)
+        highlighted = highlighting.highlight_block(
+            self.builder, node.rawsource, lang, opts, linenos, highlight_args,
+            warner)
         self.body.append(self.starttag(node, 'div', CLASS='highlight-%s' % lang))
         self.body.append(highlighted)
         self.body.append(u'</div>\n')
@@ -288,7 +326,9 @@ class BootstrapTranslator(nodes.NodeVisitor, object):
                 u'</button>')
         if type:
             node.insert(0, nodes.title(type, admonitionlabels[type]))
+        self.admonition_level += 1
     def depart_admonition(self, node):
+        self.admonition_level -= 1
         self.body.append(u'</div>')
     visit_note = lambda self, node: self.visit_admonition(node, 'note')
     visit_warning = lambda self, node: self.visit_admonition(node, 'warning')
@@ -369,10 +409,24 @@ class BootstrapTranslator(nodes.NodeVisitor, object):
 
     def visit_image(self, node):
         uri = node['uri']
+        variants = size = None
         if uri in self.builder.images:
-            uri = posixpath.join(self.builder.imgpath,
-                                 self.builder.images[uri])
+            name = self.builder.images[uri]
+            size = images.image_size(os.path.join(self.builder.srcdir, uri))
+            uri = posixpath.join(self.builder.imgpath, name)
+            variants = getattr(self.builder, 'odoo_image_variants', {}).get(name)
         attrs = {'src': uri, 'class': 'img-responsive'}
+        if size:
+            # lets the browser lay the page out before the image is loaded
+            attrs['width'], attrs['height'] = size
+        self.image_count += 1
+        if self.image_count > self.config.odoo_eager_images:
+            attrs['loading'] = 'lazy'
+        attrs['decoding'] = 'async'
+        webp_srcset = None
+        if variants and (variants['widths'] or variants['webp']):
+            attrs['srcset'], webp_srcset, attrs['sizes'] = images.srcsets(
+                self.builder.imgpath, name, variants)
         if 'alt' in node:
             attrs['alt'] = node['alt']
         if 'align' in node:
@@ -393,7 +447,13 @@ class BootstrapTranslator(nodes.NodeVisitor, object):
             for name in ['width', 'height']
             if name in node
         )
-        self.body.append(self.starttag(node, 'img', **attrs))
+        if webp_srcset:
+            self.body.append(u'<picture><source type="image/webp" srcset="{}" sizes="{}">'.format(
+                self.attval(webp_srcset), self.attval(attrs['sizes'])))
+            self.body.append(self.starttag(node, 'img', **attrs))
+            self.body.append(u'</picture>')
+        else:
+            self.body.append(self.starttag(node, 'img', **attrs))
     def depart_image(self, node): pass
     def visit_figure(self, node):
         self.body.append(self.starttag(node, 'div'))
@@ -427,19 +487,23 @@ class BootstrapTranslator(nodes.NodeVisitor, object):
     def depart_tgroup(self, node): pass
     def visit_colspec(self, node): raise nodes.SkipNode
     def visit_thead(self, node):
+        self.table_sections.append('thead')
         self.body.append(self.starttag(node, 'thead'))
     def depart_thead(self, node):
+        self.table_sections.pop()
         self.body.append(u'</thead>')
     def visit_tbody(self, node):
+        self.table_sections.append('tbody')
         self.body.append(self.starttag(node, 'tbody'))
     def depart_tbody(self, node):
+        self.table_sections.pop()
         self.body.append(u'</tbody>')
     def visit_row(self, node):
         self.body.append(self.starttag(node, 'tr'))
     def depart_row(self, node):
         self.body.append(u'</tr>')
     def visit_entry(self, node):
-        if isinstance(node.parent.parent, nodes.thead):
+        if self.table_sections[-1] == 'thead':
             tagname = 'th'
         else:
             tagname = 'td'
@@ -491,7 +555,7 @@ class BootstrapTranslator(nodes.NodeVisitor, object):
             'href': node['refuri'] if 'refuri' in node else '#' + node['refid']
         }
         attrs['class'] += ' internal' if (node.get('internal') or 'refuri' not in node) else ' external'
-        if any(isinstance(ancestor, nodes.Admonition) for ancestor in _parents(node)):
+        if self.admonition_level:
             attrs['class'] += ' alert-link'
 
         if 'reftitle' in node:
@@ -649,42 +713,49 @@ class BootstrapTranslator(nodes.NodeVisitor, object):
         #         figcaption
         #           {{ card title }}
         env = self.builder.env
-        conf = self.builder.app.config
+        cards = env.odoo_cards
+        baseuri = self.builder.get_target_uri(node['parent'])
         for title, ref in ((e[0], e[1]) for e in node['entries']):
             # external URL, no toc, can't recurse into
-            if ref not in env.tocs:
+            if ref not in cards:
                 continue
-            toc = env.tocs[ref].traverse(addnodes.toctree)
+            card = cards[ref]
 
-            classes = env.metadata[ref].get('types', 'tutorials')
-            classes += ' toc-single-entry' if not toc else ' toc-section'
+            classes = card.types
+            classes += ' toc-single-entry' if card.children is None else ' toc-section'
             self.body.append(self.starttag(node, 'div', CLASS="row " + classes))
             self.body.append(u'<h2 class="col-sm-12">')
-            self.body.append(title if title else util.nodes.clean_astext(env.titles[ref]))
+            self.body.append(title if title else card.title)
             self.body.append(u'</h2>')
 
-            entries = [(title, ref)] if not toc else ((e[0], e[1]) for e in list(toc)[0]['entries'])
+            entries = [(title, ref)] if card.children is None else card.children
             for subtitle, subref in entries:
-                baseuri = self.builder.get_target_uri(node['parent'])
-
-                if subref in env.metadata:
-                    cover = env.metadata[subref].get('banner', conf.odoo_cover_default)
-                elif subref in conf.odoo_cover_external:
-                    cover = conf.odoo_cover_external[subref]
+                subcard = cards.get(subref)
+                if subcard is not None:
+                    banner = subcard.banner
                 else:
-                    cover = conf.odoo_cover_default_external
-
-                if cover:
-                    banner = '_static/' + cover
-                    base, ext = os.path.splitext(banner)
-                    small = "{}.small{}".format(base, ext)
-                    if os.path.isfile(url2pathname(small)):
-                        banner = small
+                    banner = external_banner(self.builder.app, subref)
+
+                if banner:
+                    banner, webp = images.card_banner(self.builder, banner)
                     style = u"background-image: url('{}')".format(
                         util.relative_uri(baseuri, banner) or '#')
+                    if webp:
+                        # browsers without image-set() keep the first one
+                        style += u"; background-image: image-set(url('{}') type('image/webp'), url('{}') type('{}'))".format(
+                            util.relative_uri(baseuri, webp),
+                            util.relative_uri(baseuri, banner),
+                            'image/png' if banner.lower().endswith('.png') else 'image/jpeg')
                 else:
                     style = u''
 
+                if subtitle:
+                    subtitle_text = subtitle
+                elif subcard is not None:
+                    subtitle_text = subcard.title
+                else:
+                    subtitle_text = util.nodes.clean_astext(env.titles[subref])
+
                 self.body.append(u"""
                 <div class="col-sm-6 col-md-3">
                 <figure class="card">
@@ -698,7 +769,7 @@ class BootstrapTranslator(nodes.NodeVisitor, object):
                     link=subref if util.url_re.match(subref) else util.relative_uri(
                         baseuri, self.builder.get_target_uri(subref)),
                     style=style,
-                    title=subtitle if subtitle else util.nodes.clean_astext(env.titles[subref]),
+                    title=subtitle_text,
                 ))
 
             self.body.append(u'</div>')
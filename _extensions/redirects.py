@@ -1,5 +1,6 @@
 # Adapted from https://github.com/sphinx-contrib/redirects
 
+import json
 import os
 import re
 from pathlib import Path
@@ -9,9 +10,24 @@ from sphinx.util import logging as logging
 
 TEMPLATE = '<html><head><meta http-equiv="refresh" content="0; url=%s"/></head></html>'
 
+MAP_HEADER = """\
+# Generated from the redirects file, to be included in the http block:
+#
+#     include redirects.map;
+#     server {
+#         if ($redirect_uri) { return 301 $redirect_uri; }
+#     }
+map $uri $redirect_uri {
+"""
+
 logger = logging.getLogger(__name__)
 
+# docname of a redirected document: (docname of its final target, line of its
+# rule in the redirects file)
+redirections = {}
+
 def generate_redirects(app):
+    redirections.clear()
     path = os.path.join(app.srcdir, app.config.redirects_file)
     if not os.path.exists(path):
         logger.debug("Could not find redirects file at '%s'", path)
@@ -23,12 +39,13 @@ def generate_redirects(app):
         logger.info("Redirects are only supported by the 'html' builder. Skipping...")
         return
 
+    rules = {}
     with open(path) as redirects:
         escaped_source_suffix = source_suffix.replace('.', '\.')
         pattern = re.compile(
             r'^[ \t]*([\w\-/]+{0})[ \t]+([\w\-/]+{0})[ \t]*(#.*)?$'.format(escaped_source_suffix)
         )
-        for line in redirects.readlines():
+        for lineno, line in enumerate(redirects, 1):
             # Exclude comment or empty lines
             if not line.rstrip() or line.startswith('#'):
                 continue
@@ -46,19 +63,88 @@ def generate_redirects(app):
 
             # Parse the rule
             from_file, to_file, _ = match_result.groups()
-            logger.debug("Redirecting '%s' to '%s'", from_file, to_file)
+            from_doc = from_file[:-len(source_suffix)]
+            if from_doc in rules:
+                logger.warning(
+                    "Redirection of '%s' overrides the one on line %d", from_file, rules[from_doc][1],
+                    location='%s:%d' % (path, lineno))
+            rules[from_doc] = (to_file[:-len(source_suffix)], lineno)
+
+    # Collapse the chains of redirections (A -> B, B -> C) so every page is
+    # redirected to its final target in a single hop
+    for from_doc, (to_doc, lineno) in rules.items():
+        chain = [from_doc]
+        while to_doc in rules and to_doc not in chain:
+            chain.append(to_doc)
+            to_doc = rules[to_doc][0]
+        # Rules leading into a cycle stop at its first page
+        if to_doc == from_doc:
+            logger.error(
+                "Ignoring redirection cycle: %s", ' -> '.join(chain + [to_doc]),
+                location='%s:%d' % (path, lineno))
+            continue
+        logger.debug("Redirecting '%s' to '%s'", from_doc, to_doc)
+        redirections[from_doc] = (to_doc, lineno)
+
+    for from_doc, (to_doc, _) in redirections.items():
+        # Prepare source and destination paths
+        to_path_prefix = '../' * from_doc.count('/')
+        absolute_from_path = Path(app.builder.outdir) / (from_doc + '.html')
+
+        # Create the redirection
+        absolute_from_path.parent.mkdir(parents=True, exist_ok=True)
+        absolute_from_path.write_text(TEMPLATE % (to_path_prefix + to_doc + '.html'))
+
+    write_maps(app.builder.outdir, app.config.redirects_prefix)
+
 
-            # Prepare source and destination paths
-            to_path_prefix = '../' * from_file.count('/')
-            from_html_file = from_file.replace(source_suffix, '.html')
-            to_html_file = to_path_prefix + to_file.replace(source_suffix, '.html')
-            absolute_from_path = Path(app.builder.outdir) / from_html_file
+def write_maps(outdir, prefix):
+    """ Writes the redirections as an nginx ``map`` of the URIs of the
+    redirected pages to the URIs of their targets (``redirects.map``), and as
+    a trie of the path segments of the redirected pages to the paths of their
+    targets, relative to the root of the documentation (``redirects.json``)
+    """
+    with open(os.path.join(outdir, 'redirects.map'), 'w') as f:
+        f.write(MAP_HEADER)
+        for from_doc, (to_doc, _) in sorted(redirections.items()):
+            f.write('    %s%s.html %s%s.html;\n' % (prefix, from_doc, prefix, to_doc))
+        f.write('}\n')
 
-            # Create the redirection
-            absolute_from_path.parent.mkdir(parents=True, exist_ok=True)
-            absolute_from_path.write_text(TEMPLATE % to_html_file)
+    trie = {}
+    for from_doc, (to_doc, _) in redirections.items():
+        *dirs, name = from_doc.split('/')
+        node = trie
+        for segment in dirs:
+            node = node.setdefault(segment, {})
+        node[name + '.html'] = to_doc + '.html'
+    with open(os.path.join(outdir, 'redirects.json'), 'w') as f:
+        json.dump(trie, f, separators=(',', ':'), sort_keys=True)
+
+
+def check_redirects(app, exception):
+    if exception or not redirections:
+        return
+
+    path = os.path.join(app.srcdir, app.config.redirects_file)
+    source_suffix = next(iter(app.config.source_suffix))
+    for from_doc, (to_doc, lineno) in sorted(redirections.items(), key=lambda item: item[1][1]):
+        if to_doc not in app.env.found_docs:
+            logger.warning(
+                "Redirection target '%s' does not exist", to_doc + source_suffix,
+                location='%s:%d' % (path, lineno))
+        if from_doc in app.env.found_docs:
+            logger.warning(
+                "Redirected page '%s' still exists and overrides its redirection", from_doc + source_suffix,
+                location='%s:%d' % (path, lineno))
 
 
 def setup(app):
     app.add_config_value('redirects_file', 'redirects', 'env')
+    # URI of the root of the documentation in the nginx map of the redirections
+    app.add_config_value('redirects_prefix', '/', '')
     app.connect('builder-inited', generate_redirects)
+    app.connect('build-finished', check_redirects)
+    return {
+        'parallel_read_safe': True,
+        'parallel_write_safe': True,
+    }
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+""" Benchmarks the compact paragraph detection of the HTML translator.
+
+A synthetic document with a list item and a table cell of thousands of
+sibling paragraphs is parsed, and every paragraph is checked with
+``BootstrapTranslator.is_compact_paragraph`` as the translator does when
+rendering it. The cost per paragraph must not grow with the number of
+siblings, the benchmark fails if it does by more than ``--max-ratio`` between
+the narrowest and the widest containers.
+
+``./bench_compact_paragraphs.py -n 1000 -n 8000`` only runs the given widths.
+"""
+import argparse
+import os
+import sys
+import time
+import types
+
+from docutils import nodes
+from docutils.core import publish_doctree
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '_extensions'))
+from odoo.translator import BootstrapTranslator
+
+WIDTHS = [500, 1000, 2000, 4000, 8000]
+
+def document(width):
+    paragraphs = '\n\n'.join('Paragraph %d.' % i for i in range(width))
+    source = (
+        "* %s\n\n"
+        ".. list-table::\n\n"
+        "   * - %s\n"
+    ) % (
+        paragraphs.replace('\n\n', '\n\n  '),
+        paragraphs.replace('\n\n', '\n\n       '),
+    )
+    return publish_doctree(source, settings_overrides={'report_level': 5})
+
+def translator(doctree):
+    builder = types.SimpleNamespace(config=types.SimpleNamespace(
+        highlight_language='python', highlight_options={}))
+    # not a Builder, so passed in the order of Sphinx 1.x
+    return BootstrapTranslator(doctree, builder)
+
+def bench(width, repeat):
+    doctree = document(width)
+    paragraphs = list(doctree.traverse(nodes.paragraph))
+    best = float('inf')
+    for _ in range(repeat):
+        visitor = translator(doctree)
+        start = time.perf_counter()
+        compact = sum(visitor.is_compact_paragraph(p) for p in paragraphs)
+        best = min(best, time.perf_counter() - start)
+    return len(paragraphs), compact, best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument(
+        '-n', '--width', type=int, action='append', dest='widths',
+        help="number of sibling paragraphs, %s by default" % ', '.join(map(str, WIDTHS)))
+    parser.add_argument(
+        '-r', '--repeat', type=int, default=5,
+        help="runs per width, the best one is kept")
+    parser.add_argument(
+        '--max-ratio', type=float, default=3,
+        help="maximum ratio of the costs per paragraph of the widest and "
+             "narrowest containers")
+    args = parser.parse_args()
+
+    costs = []
+    for width in sorted(args.widths or WIDTHS):
+        count, compact, duration = bench(width, args.repeat)
+        costs.append(duration / count)
+        print("%6d siblings: %6d paragraphs (%d compact) in %8.2fms, %6.2fus per paragraph" % (
+            width, count, compact, duration * 1000, duration / count * 1e6), flush=True)
+
+    ratio = costs[-1] / costs[0]
+    print("cost per paragraph grew %.1fx (at most %.1fx)" % (ratio, args.max_ratio))
+    return 1 if ratio > args.max_ratio else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+""" Benchmarks the HTML translator on the doctrees of the documentation.
+
+The doctrees of a previous HTML build (``make html``) are loaded and resolved
+once, then rendered through ``BootstrapTranslator`` as the HTML builder does,
+with the current ``starttag`` and with the one it replaced (which rebuilt
+the attributes through intermediate dicts and lists, deduplicated classes
+through a set and escaped every value again). The number of nodes rendered
+per second is reported for both, as well as whether they rendered the same
+bodies once the order of the classes is ignored.
+
+``./bench_translator.py -d _build/doctrees -r 5`` runs on the given doctrees.
+"""
+import argparse
+import contextlib
+import io
+import os
+import re
+import sys
+import tempfile
+import time
+import warnings
+
+from sphinx.application import Sphinx
+from sphinx.util.docutils import docutils_namespace
+from sphinx.util.osutil import relative_uri
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, '_extensions'))
+from odoo.translator import BootstrapTranslator, WHITESPACE
+
+CLASSES = re.compile(r'class="([^"]*)"')
+
+class LegacyTranslator(BootstrapTranslator):
+    """ ``starttag`` and ``attval`` before they were optimised
+    """
+    def starttag(self, node, tagname, **attributes):
+        tagname = tagname.lower()
+
+        # extract generic attributes
+        attrs = {name.lower(): value for name, value in attributes.items()}
+        attrs.update(
+            (name, value) for name, value in node.attributes.items()
+            if name.startswith('data-')
+        )
+
+        prefix = []
+        postfix = []
+
+        # handle possibly multiple ids
+        assert 'id' not in attrs, "starttag can't be passed a single id attribute, use a list of ids"
+        ids = node.get('ids', []) + attrs.pop('ids', [])
+        if ids:
+            _ids = iter(ids)
+            attrs['id'] = next(_ids)
+            postfix.extend(u'<i id="{}"></i>'.format(_id) for _id in _ids)
+
+        # set CSS class
+        classes = set(node.get('classes', []) + attrs.pop('class', '').split())
+        if classes:
+            attrs['class'] = u' '.join(classes)
+
+        return u'{prefix}<{tag} {attrs}>{postfix}'.format(
+            prefix=u''.join(prefix),
+            tag=tagname,
+            attrs=u' '.join(u'{}="{}"'.format(name, self.attval(value))
+                            for name,  value in attrs.items()),
+            postfix=u''.join(postfix),
+        )
+
+    def attval(self, value):
+        return self.encode(WHITESPACE.sub(u' ', str(value)))
+
+def load(doctreedir, outdir):
+    """ Returns the HTML builder of the documentation and its resolved
+    doctrees, by docname
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        app = Sphinx(ROOT, ROOT, outdir, doctreedir, 'html', status=None, warning=None)
+    if not app.env.all_docs:
+        sys.exit("no doctrees in %s, build the documentation first (make html)" % doctreedir)
+    builder = app.builder
+    builder.prepare_writing(set(app.env.all_docs))
+    doctrees = {}
+    for docname in sorted(app.env.all_docs):
+        doctree = doctrees[docname] = app.env.get_and_resolve_doctree(docname, builder)
+        # as write_doc_serialized and write_doc do
+        builder.imgpath = relative_uri(builder.get_target_uri(docname), builder.imagedir)
+        builder.post_process_images(doctree)
+        doctree.settings = builder.docsettings
+    return builder, doctrees
+
+def prepare(builder, docname):
+    # as write_doc does before rendering a document
+    builder.secnumbers = builder.env.toc_secnumbers.get(docname, {})
+    builder.fignumbers = builder.env.toc_fignumbers.get(docname, {})
+    builder.imgpath = relative_uri(builder.get_target_uri(docname), '_images')
+    builder.dlpath = relative_uri(builder.get_target_uri(docname), '_downloads')
+    builder.current_docname = docname
+
+def render(translator_class, builder, doctrees):
+    """ Renders all ``doctrees``
+
+    :returns: (duration, number of starttag calls, rendered bodies)
+    """
+    calls = [0]
+    starttag = translator_class.starttag
+    def counted(self, *args, **kwargs):
+        calls[0] += 1
+        return starttag(self, *args, **kwargs)
+    bodies = {}
+    duration = 0
+    # the translator prints the nodes it does not know about
+    with contextlib.redirect_stdout(io.StringIO()):
+        for docname, doctree in doctrees.items():
+            prepare(builder, docname)
+            # the translator changes some nodes (e.g. adds the titles of the
+            # admonitions), each rendering needs its own copy
+            copy = doctree.deepcopy()
+            visitor = translator_class(builder, copy)
+            start = time.perf_counter()
+            copy.walkabout(visitor)
+            duration += time.perf_counter() - start
+            bodies[docname] = visitor.astext()
+            # counted separately, so the timed runs don't pay for the counting
+            copy = doctree.deepcopy()
+            visitor = translator_class(builder, copy)
+            visitor.starttag = counted.__get__(visitor)
+            copy.walkabout(visitor)
+    return duration, calls[0], bodies
+
+def normalize(body):
+    return CLASSES.sub(lambda m: 'class="%s"' % ' '.join(sorted(m.group(1).split())), body)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument(
+        '-d', '--doctrees', default=os.path.join(ROOT, '_build', 'doctrees'),
+        help="doctree directory of an HTML build, %(default)s by default")
+    parser.add_argument(
+        '-r', '--repeat', type=int, default=3,
+        help="renderings of the corpus per translator, the fastest is kept")
+    args = parser.parse_args()
+
+    with docutils_namespace(), tempfile.TemporaryDirectory() as outdir:
+        builder, doctrees = load(os.path.abspath(args.doctrees), outdir)
+        count = sum(1 for doctree in doctrees.values() for _ in doctree.traverse())
+        print("%d documents, %d nodes" % (len(doctrees), count))
+
+        results = {}
+        for name, translator_class in [('before', LegacyTranslator), ('after', BootstrapTranslator)]:
+            durations = []
+            for _ in range(args.repeat):
+                duration, calls, bodies = render(translator_class, builder, doctrees)
+                durations.append(duration)
+            duration = min(durations)
+            results[name] = bodies
+            print("%-6s %8.0f nodes/s (%.2fs, %d starttag calls)" % (
+                name, count / duration, duration, calls), flush=True)
+
+    different = [
+        docname for docname in doctrees
+        if normalize(results['before'][docname]) != normalize(results['after'][docname])
+    ]
+    if different:
+        print("different bodies: %s" % ', '.join(different))
+        return 1
+    print("identical bodies once the order of the classes is ignored")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+""" Builds the HTML documentation in several languages at once.
+
+Every language of ``LANGUAGES`` (in ``conf.py``), or those given on the
+command line, is built by its own ``sphinx-build`` process, like
+``make i18nhtml LANG=<language>`` would. The builds share the caches of
+the work which doesn't depend on the language (highlighted code blocks,
+image variants and sizes, theme assets, compiled catalogs), and the first language is
+built on its own with all the jobs to fill them before the others are
+built concurrently.
+
+The arguments after ``--`` are passed to ``sphinx-build``, e.g.
+``./build_languages.py fr es -j 4 -- -D canonical_root=...``.
+"""
+import argparse
+import concurrent.futures
+import os
+import subprocess
+import sys
+import time
+
+from conf import LANGUAGES
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+def jobs(value):
+    if value == 'auto':
+        return os.cpu_count() or 1
+    count = int(value)
+    if count < 1:
+        raise ValueError(value)
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.split('\n\n')[0].strip(),
+        usage="%(prog)s [options] [LANGUAGE ...] [-- SPHINX-BUILD ARGUMENTS]",
+        epilog="Arguments after -- are passed to sphinx-build.")
+    parser.add_argument(
+        'languages', nargs='*', metavar='LANGUAGE',
+        help="languages to build, all of LANGUAGES by default")
+    parser.add_argument(
+        '-j', '--jobs', type=jobs, default=os.cpu_count() or 1,
+        help="number of processes to use, or 'auto' for one per core (the default)")
+    parser.add_argument('--builddir', default='_build')
+    parser.add_argument('--sphinx-build', default='sphinx-build')
+    argv = sys.argv[1:]
+    # the arguments of sphinx-build may look like languages (e.g. the value
+    # of -D) or like our own options (e.g. -j auto)
+    if '--' in argv:
+        argv, sphinx_args = argv[:argv.index('--')], argv[argv.index('--') + 1:]
+    else:
+        sphinx_args = []
+    args = parser.parse_args(argv)
+
+    languages = args.languages or sorted(LANGUAGES)
+    unknown = set(languages) - set(LANGUAGES)
+    if unknown:
+        parser.error("unknown languages: %s" % ', '.join(sorted(unknown)))
+
+    builddir = os.path.join(ROOT, args.builddir)
+    os.makedirs(os.path.join(builddir, 'logs'), exist_ok=True)
+    shared = [
+        '-D', 'odoo_highlight_cache=' + os.path.join(builddir, 'doctrees', 'highlight.db'),
+        '-D', 'odoo_image_cache=' + os.path.join(builddir, 'doctrees', 'images'),
+        '-D', 'odoo_asset_cache=' + os.path.join(builddir, 'doctrees', 'assets'),
+        '-D', 'odoo_catalog_cache=' + os.path.join(builddir, 'locale'),
+    ]
+
+    def build(language, jobs):
+        command = [
+            args.sphinx_build, '-b', 'html', '-j', str(jobs),
+            '-d', os.path.join(builddir, 'doctrees', language),
+            '-D', 'language=' + language,
+        ] + shared + sphinx_args + [
+            ROOT, os.path.join(builddir, 'html', language),
+        ]
+        log = os.path.join(builddir, 'logs', language + '.log')
+        start = time.time()
+        with open(log, 'w') as f:
+            returncode = subprocess.call(command, cwd=ROOT, stdout=f, stderr=subprocess.STDOUT)
+        duration = time.time() - start
+        print("%-6s %s in %6.1fs (%s)" % (
+            language, 'built' if returncode == 0 else 'FAILED',
+            duration, os.path.relpath(log, ROOT)), flush=True)
+        return returncode
+
+    start = time.time()
+    first, rest = languages[0], languages[1:]
+    failed = [first] if build(first, args.jobs) else []
+    if rest:
+        workers = min(args.jobs, len(rest))
+        with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+            results = pool.map(lambda l: build(l, max(1, args.jobs // workers)), rest)
+            failed.extend(l for l, returncode in zip(rest, results) if returncode)
+
+    print("%d languages built in %.1fs with %d processes" % (
+        len(languages) - len(failed), time.time() - start, args.jobs))
+    if failed:
+        print("failed: %s" % ', '.join(failed))
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+""" Checks the demo:fields fetch engine against a local stub of the demo server.
+
+Every scenario starts an XML-RPC stub answering like demo.odoo.com (the
+``start`` route, then ``xmlrpc/2/common`` and ``xmlrpc/2/object``), submits
+a few fetches to a new engine and checks how they are resolved, and that
+they all are within a bounded time: slow calls must succeed, hung calls must
+time out and malformed responses must be reported as errors rather than
+block the build.
+
+``./check_demo_fields.py slow hung`` only runs the given scenarios.
+
+``./check_demo_fields.py --bench 200`` benchmarks the engine instead: 200
+fetches are submitted against a stub whose calls are slow and sometimes hang,
+and the latency percentiles of the fetches, the XML-RPC round trips per batch
+and the retries are reported for the engine, for the engine with batches of
+one fetch, and for a baseline without its changes (no deadlines nor retries,
+batches of one fetch, 4 calls at once like the fetcher threads it replaced).
+"""
+import argparse
+import collections
+import concurrent.futures
+import os
+import random
+import socketserver
+import sys
+import threading
+import time
+from xmlrpc.server import MultiPathXMLRPCServer, SimpleXMLRPCDispatcher, SimpleXMLRPCRequestHandler
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '_extensions'))
+import demo_link
+
+XIDS = ['sale.action_quotations', 'crm.crm_lead_action_pipeline', 'stock.action_picking_tree_all']
+FORM = '<form><field name="name"/><field name="partner_id"/></form>'
+FIELDS = {
+    'name': {'string': 'Reference', 'help': 'Reference of the record'},
+    'partner_id': {'string': 'Customer', 'help': 'Customer of the record'},
+}
+# engine settings, short so hung calls fail quickly
+TIMEOUT = 0.5
+RETRIES = 1
+
+# name: (stub behaviour, expected result of every fetch)
+SCENARIOS = {
+    'ok': ({}, 'fields'),
+    'slow': ({'delay': TIMEOUT / 2}, 'fields'),
+    'hung': ({'delay': 30}, 'timeout'),
+    'no-host': ({'start': {'database': 'demo', 'user': 'admin', 'password': 'admin'}}, 'error'),
+    'truncated-arch': ({'arch': FORM[:20]}, 'error'),
+    'no-fields-views': ({'fields_views': False}, 'error'),
+    'malformed-response': ({'malformed': True}, 'error'),
+}
+
+class StubHandler(SimpleXMLRPCRequestHandler):
+    rpc_paths = ()
+
+    def do_POST(self):
+        with self.server.lock:
+            self.server.requests[self.path] += 1
+        if self.server.options.get('malformed') and self.path == '/xmlrpc/2/object':
+            body = b'<?xml version="1.0"?><methodResponse><params><param><value><struct>'
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/xml')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        super().do_POST()
+
+    def log_message(self, *args):
+        pass
+
+class StubServer(socketserver.ThreadingMixIn, MultiPathXMLRPCServer):
+    daemon_threads = True
+    block_on_close = False
+
+    def __init__(self, options):
+        super().__init__(('127.0.0.1', 0), StubHandler, logRequests=False, allow_none=True)
+        self.options = options
+        self.lock = threading.Lock()
+        # round trips by path
+        self.requests = collections.Counter()
+        self.random = random.Random(options.get('seed', 0))
+        url = 'http://127.0.0.1:%d' % self.server_address[1]
+        self.start_info = options.get('start', {
+            'host': url, 'database': 'demo', 'user': 'admin', 'password': 'admin'})
+        for path, function in [
+            ('/start', self.start),
+            ('/xmlrpc/2/common', self.authenticate),
+            ('/xmlrpc/2/object', self.execute_kw),
+        ]:
+            dispatcher = SimpleXMLRPCDispatcher(allow_none=True)
+            dispatcher.register_function(function, function.__name__)
+            self.add_dispatcher(path, dispatcher)
+
+    def start(self):
+        return self.start_info
+
+    def authenticate(self, db, login, password, context):
+        return 2
+
+    def execute_kw(self, db, uid, password, model, method, args, kwargs):
+        with self.lock:
+            hung = self.random.random() < self.options.get('hang_ratio', 0)
+        time.sleep(self.options['hang'] if hung else self.options.get('delay', 0))
+        if (model, method) == ('ir.model.data', 'search_read'):
+            # ['|', '&', module = x, name = y, '&', module = z, name = t]
+            leaves = [leaf for leaf in args[0] if isinstance(leaf, list)]
+            names = [(module[2], name[2]) for module, name in zip(leaves[0::2], leaves[1::2])]
+            return [
+                {'module': module, 'name': name, 'model': 'ir.actions.act_window', 'res_id': i}
+                for i, (module, name) in enumerate(names, 1)
+            ]
+        if (model, method) == ('ir.actions.act_window', 'read'):
+            return [{'id': id_, 'res_model': 'res.partner', 'views': [[False, 'form']]} for id_ in args[0]]
+        if method == 'load_views':
+            if self.options.get('fields_views') is False:
+                return {}
+            return {'fields_views': {
+                view: {'arch': self.options.get('arch', FORM), 'fields': FIELDS}
+                for _, view in args[0]
+            }}
+        raise ValueError("unexpected call %s.%s" % (model, method))
+
+def run(name, options, expected):
+    server = StubServer(options)
+    server_thread = concurrent.futures.ThreadPoolExecutor(1)
+    server_thread.submit(server.serve_forever)
+    engine = demo_link.FetchEngine(
+        timeout=TIMEOUT, retries=RETRIES,
+        start_url='http://127.0.0.1:%d/start' % server.server_address[1])
+    # as many calls as a batch can make, each of them tried RETRIES + 1
+    # times with a backoff, and some margin
+    deadline = 5 * (RETRIES + 1) * (TIMEOUT + demo_link.RETRY_BACKOFF * 2 ** RETRIES * 1.5) + 5
+    start = time.time()
+    futures = [engine.submit(xid) for xid in XIDS]
+    results = []
+    for future in futures:
+        try:
+            value = future.result(timeout=max(0, deadline - (time.time() - start)))
+            if isinstance(value, dict):
+                results.append('fields')
+            # a hung call fails on the engine's deadline or on the socket's
+            # timeout, whichever comes first
+            elif isinstance(value, str):
+                results.append('timeout' if 'timed out' in value else 'error')
+            else:
+                results.append(repr(value))
+        except concurrent.futures.TimeoutError:
+            results.append('timeout' if future.done() else 'pending')
+    duration = time.time() - start
+    engine.close()
+    server.shutdown()
+    server.server_close()
+    server_thread.shutdown(wait=False)
+
+    ok = all(result == expected for result in results)
+    print("%-20s %-4s %6.2fs  expected %-7s got %s" % (
+        name, 'ok' if ok else 'FAIL', duration, expected, ', '.join(results)), flush=True)
+    return ok
+
+def bench(name, count, options, engine_options, batch_size):
+    server = StubServer(options)
+    server_thread = concurrent.futures.ThreadPoolExecutor(1)
+    server_thread.submit(server.serve_forever)
+    demo_link.telemetry = demo_link.Telemetry()
+    fetch_batch_size, demo_link.FETCH_BATCH_SIZE = demo_link.FETCH_BATCH_SIZE, batch_size
+    engine = demo_link.FetchEngine(
+        start_url='http://127.0.0.1:%d/start' % server.server_address[1],
+        **engine_options)
+    batches = [0]
+    run_batch = engine._run_batch
+    async def counted(tasks):
+        batches[0] += 1
+        return await run_batch(tasks)
+    engine._run_batch = counted
+
+    latencies = []
+    outcomes = collections.Counter()
+    def done(submitted, future):
+        latencies.append(time.time() - submitted)
+        if future.exception() is not None:
+            outcomes['timeouts'] += 1
+        elif isinstance(future.result(), str):
+            outcomes['timeouts' if 'timed out' in future.result() else 'errors'] += 1
+    start = time.time()
+    futures = []
+    for i in range(count):
+        future = engine.submit('bench.action_%d' % i)
+        future.add_done_callback(lambda f, submitted=time.time(): done(submitted, f))
+        futures.append(future)
+    _, pending = concurrent.futures.wait(futures, timeout=options['hang'] * count)
+    duration = time.time() - start
+    engine.close()
+    demo_link.FETCH_BATCH_SIZE = fetch_batch_size
+    server.shutdown()
+    server.server_close()
+    server_thread.shutdown(wait=False)
+
+    percentile = demo_link._percentile
+    objects = server.requests['/xmlrpc/2/object']
+    print("%-9s p50 %6.2fs  p95 %6.2fs  p99 %6.2fs  max %6.2fs  (%.1fs total)" % (
+        name, percentile(latencies, 50), percentile(latencies, 95),
+        percentile(latencies, 99), max(latencies), duration))
+    print("%-9s %d resolved (%d timeouts, %d errors), %d pending, %d batches, "
+          "%.1f round trips per batch (%d in all), %d retries" % (
+        '', count - len(pending), outcomes['timeouts'], outcomes['errors'],
+        len(pending), batches[0], objects / max(1, batches[0]),
+        sum(server.requests.values()), demo_link.telemetry.counters['retries']),
+        flush=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument(
+        'scenarios', nargs='*', metavar='SCENARIO',
+        help="scenarios to run (%s), all by default" % ', '.join(SCENARIOS))
+    parser.add_argument(
+        '--bench', type=int, metavar='FETCHES',
+        help="benchmark the engine on this many fetches instead of running scenarios")
+    group = parser.add_argument_group("benchmark options")
+    group.add_argument('--delay', type=float, default=0.05, help="seconds per stub call (%(default)s)")
+    group.add_argument(
+        '--hang-ratio', type=float, default=0.05, help="ratio of stub calls which hang (%(default)s)")
+    group.add_argument('--hang', type=float, default=5, help="seconds a hung call hangs (%(default)s)")
+    group.add_argument('--concurrency', type=int, default=4, help="engine concurrency (%(default)s)")
+    group.add_argument('--timeout', type=float, default=1, help="engine deadline per call (%(default)s)")
+    group.add_argument('--retries', type=int, default=2, help="engine retries (%(default)s)")
+    args = parser.parse_args()
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error("unknown scenarios: %s" % ', '.join(sorted(unknown)))
+
+    if args.bench:
+        options = {'delay': args.delay, 'hang_ratio': args.hang_ratio, 'hang': args.hang}
+        print("%d fetches, stub calls take %.2fs, %d%% of them hang for %.0fs" % (
+            args.bench, args.delay, args.hang_ratio * 100, args.hang), flush=True)
+        engine_options = {'concurrency': args.concurrency, 'timeout': args.timeout, 'retries': args.retries}
+        bench('engine', args.bench, options, engine_options, demo_link.FETCH_BATCH_SIZE)
+        # the deadlines and retries alone
+        bench('unbatched', args.bench, options, engine_options, 1)
+        bench('baseline', args.bench, options, {
+            'concurrency': 4, 'timeout': None, 'retries': 0,
+        }, 1)
+        return 0
+
+    failed = [
+        name for name in args.scenarios or SCENARIOS
+        if not run(name, *SCENARIOS[name])
+    ]
+    if failed:
+        print("failed: %s" % ', '.join(failed))
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -302,6 +302,24 @@ texinfo_documents = [
 
 odoo_cover_external = {}
 
+# Glob patterns of the classes and ids whose rules are kept when purging the
+# stylesheet, for those which scripts only add from computed names.
+#odoo_css_allowlist = []
+
+# scripts of the interactive examples, only loaded by the pages listing their
+# bundle in the ``scripts`` field of their metadata (e.g. ``:scripts: accounting``)
+odoo_script_bundles = {
+    'accounting': [
+        'atom.js', 'prefixfree.min.js', 'immutable.js', 'react.min.js', 'accounts.js',
+        'chart-of-accounts.js', 'entries.js', 'reconciliation.js', 'misc.js',
+    ],
+    'inventory': ['atom.js', 'prefixfree.min.js', 'immutable.js', 'react.min.js', 'inventory.js'],
+    'valuation': [
+        'atom.js', 'prefixfree.min.js', 'immutable.js', 'react.min.js', 'misc.js',
+        'coa-valuation-continental.js', 'coa-valuation-anglo-saxon.js',
+    ],
+}
+
 github_user = 'odoo'
 github_project = 'documentation-user'
 
@@ -323,19 +341,6 @@ LANGUAGES = {
 def setup(app):
     app.add_stylesheet('accounting.css')
     app.add_stylesheet('legal.css')
-    app.add_javascript('prefixfree.min.js')
-    app.add_javascript('atom.js')
-    app.add_javascript('immutable.js')
-    app.add_javascript('react.min.js')
-    app.add_javascript('accounts.js')
-    app.add_javascript('chart-of-accounts.js')
-    app.add_javascript('entries.js')
-    app.add_javascript('reconciliation.js')
-    app.add_javascript('misc.js')
-
-    app.add_javascript('inventory.js')
-    app.add_javascript('coa-valuation-continental.js')
-    app.add_javascript('coa-valuation-anglo-saxon.js')
 
     app.connect('html-page-context', canonicalize)
     app.add_config_value('canonical_root', None, 'env')
@@ -350,7 +355,7 @@ def setup(app):
     app.connect('html-page-context', localize)
     app.add_config_value('languages', '', 'env')
 
-    app.connect('doctree-resolved', tag_toctrees)
+    app.connect('doctree-read', tag_toctrees)
 
 def versionize(app, pagename, templatename, context, doctree):
     """ Adds a version switcher below the menu, requires ``canonical_root``
@@ -375,8 +380,12 @@ def analytics(app, pagename, templatename, context, doctree):
 
     context['google_analytics_key'] = app.config.google_analytics_key
 
-def tag_toctrees(app, doctree, docname):
-    """ Adds a 'toc' metadata entry to all documents containing a toctree node"""
+def tag_toctrees(app, doctree):
+    """ Adds a 'toc' metadata entry to all documents containing a toctree node
+
+    Done when reading the document, so the metadata is stored in (and merged
+    back from parallel readers into) the environment.
+    """
     # document
     #   section
     #     title
@@ -391,7 +400,7 @@ def tag_toctrees(app, doctree, docname):
     if 'toctree-wrapper' not in compound['classes']:
         return
 
-    app.env.metadata[docname]['has-toc'] = True
+    app.env.metadata[app.env.docname]['has-toc'] = True
 
 def localize(app, pagename, templatename, context, doctree):
     """ Adds a language switcher below the menu, requires ``canonical_root``